@@ -120,3 +120,5 @@
 #    This means that for form handlers, GET returns the regular
 #    HTML and is not an AJAX request, but POST returns JSON data
 #    because it IS an AJAX request.
+
+default_app_config = 'sculpt.ajax.apps.SculptAjaxConfig'
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+# application configuration
+#
+# NOTE: the optional warmup (see sculpt.ajax.warmup) is not done
+# here: ready() runs in every process that sets Django up,
+# including every management command. It's done from the server's
+# entry point instead (see sculpt.ajax.wsgi), or by the
+# sculpt_ajax_warmup management command.
+#
+class SculptAjaxConfig(AppConfig):
+    name = 'sculpt.ajax'
+    verbose_name = 'Sculpt AJAX'
@@ -0,0 +1,151 @@
+from django import forms
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.translation import ugettext_lazy
+
+from sculpt.ajax import json_backends
+from sculpt.ajax.forms import error_messages, ErrorMessageCatalog
+
+import datetime
+import decimal
+import json
+import timeit
+
+#
+# micro-benchmarks for sculpt-ajax internals
+#
+# These are not tests; they report how long some of the hot
+# paths take so that changes to them can be compared. Run them
+# with the management command (which sets up Django for us):
+#
+#   ./manage.py sculpt_ajax_benchmark [name ...]
+#
+# Each benchmark returns a list of (label, value, unit) rows.
+#
+
+# the field classes and codes looked up by the error message
+# benchmarks; a mix of class-specific and classless messages,
+# and of shallow and deep MROs
+ERROR_MESSAGE_LOOKUPS = [
+        (forms.CharField, 'required'),
+        (forms.CharField, 'max_length'),
+        (forms.IntegerField, 'invalid'),
+        (forms.IntegerField, 'max_value'),
+        (forms.EmailField, 'invalid'),
+        (forms.SlugField, 'invalid'),
+        (forms.DateField, 'invalid'),
+        (forms.DecimalField, 'max_digits'),
+        (forms.TypedChoiceField, 'invalid_choice'),
+        (forms.ImageField, 'invalid_image'),
+    ]
+
+# the probe chain AjaxForm._find_error_message used before the
+# catalog existed, reproduced here so the two can be compared
+def _probe_error_message(messages, form_name, field_class, field_name, code):
+    form_specific_errors = messages.get(form_name)
+    if form_specific_errors:
+        error_id = field_name + '__' + code
+        if error_id in form_specific_errors:
+            return form_specific_errors[error_id]
+        error_id = code
+        if error_id in form_specific_errors:
+            return form_specific_errors[error_id]
+
+    class_name_list = [ cls.__name__ for cls in field_class.__mro__ ] + [ None ]
+    for class_name in class_name_list:
+        if class_name != None:
+            error_id = class_name + '__' + code
+        else:
+            error_id = code
+        if error_id in messages['_global']:
+            return messages['_global'][error_id]
+
+    return None
+
+# compare the old probe chain against the catalog, both on
+# first (cold) lookup and on repeated (memoized) lookups
+def benchmark_error_messages(iterations = 10000):
+    lookups = ERROR_MESSAGE_LOOKUPS
+
+    def probe():
+        for field_class, code in lookups:
+            _probe_error_message(error_messages, 'BenchmarkForm', field_class, 'field', code)
+
+    def catalog_cold():
+        # a fresh catalog each time, so every lookup resolves
+        # the full fallback chain (this includes the cost of
+        # building the index, which is paid once at startup)
+        catalog = ErrorMessageCatalog(error_messages)
+        for field_class, code in lookups:
+            catalog.find('BenchmarkForm', 'field', field_class, code)
+
+    catalog = ErrorMessageCatalog(error_messages)
+    def catalog_warm():
+        for field_class, code in lookups:
+            catalog.find('BenchmarkForm', 'field', field_class, code)
+
+    rows = []
+    count = iterations * len(lookups)
+    for label, fn, n in [
+            ('probe chain', probe, iterations),
+            ('catalog, cold (incl. index build)', catalog_cold, max(1, iterations / 100)),
+            ('catalog, memoized', catalog_warm, iterations),
+        ]:
+        elapsed = timeit.timeit(fn, number = n)
+        rows.append((label, elapsed * 1e9 / (n * len(lookups)), 'ns/lookup'))
+
+    return rows
+
+# typical response payloads for the JSON benchmarks: a form with
+# a handful of errors, and a mixed response with results, a toast
+# and several HTML updates
+JSON_PAYLOADS = [
+        ('form errors', {
+                'sculpt': 'ajax',
+                'form_error': [
+                        [ 'id_email', ugettext_lazy('Email address'), [ 'Email address must be a valid email address.' ] ],
+                        [ 'id_password', ugettext_lazy('Password'), [ 'Password must be at least 8 characters; you entered 5.' ] ],
+                        [ 'id_password_again', ugettext_lazy('Password (again)'), [ 'Password and Password (again) must match.' ] ],
+                        [ 'id_birth_date', ugettext_lazy('Birth date'), [ 'Birth date must be a valid date.' ] ],
+                        [ None, None, [ 'Please correct the errors below.' ] ],
+                    ],
+                'partial': { 'last_field': 'id_birth_date', 'focus_field': 'id_birth_date' },
+            }),
+        ('mixed response', {
+                'sculpt': 'ajax',
+                'results': {
+                        'cart_id': 12345,
+                        'total': decimal.Decimal('149.95'),
+                        'updated': datetime.datetime(2016, 1, 1, 12, 30),
+                        'items': [ { 'sku': 'SKU-%04d' % i, 'quantity': i, 'price': decimal.Decimal('9.99') } for i in range(20) ],
+                    },
+                'toast': [ { 'duration': 3000, 'html': '<div class="toast">Your cart has been updated.</div>' } ],
+                'html': [
+                        { 'id': 'update_%d' % i, 'html': '<ul class="sidebar">' + '<li><a href="/item/%d/">Item &#8220;%d&#8221;</a></li>' % (i, i) * 40 + '</ul>', 'class_add': 'updated' }
+                        for i in range(6)
+                    ],
+            }),
+    ]
+
+# compare encode time and output size for every installed JSON
+# backend, against Django's JsonResponse default (stdlib json with
+# DjangoJSONEncoder and its default separators)
+def benchmark_json_backends(iterations = 10000):
+    encoders = [ ('JsonResponse default', lambda data: json.dumps(data, cls = DjangoJSONEncoder)) ]
+    for name in json_backends.get_available_backends():
+        encoders.append((name, json_backends.load_backend(name)))
+
+    rows = []
+    for payload_label, payload in JSON_PAYLOADS:
+        for encoder_label, dumps in encoders:
+            label = '%s, %s' % (payload_label, encoder_label)
+            elapsed = timeit.timeit(lambda: dumps(payload), number = iterations)
+            rows.append((label, elapsed * 1e6 / iterations, 'us/encode'))
+            rows.append((label, len(dumps(payload)), 'bytes'))
+
+    return rows
+
+# all the benchmarks, by name
+BENCHMARKS = {
+        'error_messages': benchmark_error_messages,
+        'json_backends': benchmark_json_backends,
+    }
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+import threading
+import time
+
+#
+# in-process caching support
+#
+
+# a simple thread-safe, size-bounded LRU cache with an optional
+# time-to-live on entries
+#
+# This is deliberately process-local: it's meant for things
+# that are cheap to recompute but expensive enough to be worth
+# keeping around between requests handled by the same worker
+# (compiled templates, cleaned form values). For anything that
+# must be shared between workers, use Django's cache framework.
+#
+# Hit, miss and eviction counts are kept so callers can report
+# on how well the cache is working; see stats().
+#
+class LRUCache(object):
+
+    def __init__(self, max_entries, ttl = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()       # key -> (expires, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # fetch a value, or default if it's missing or expired
+    def get(self, key, default = None):
+        with self._lock:
+            try:
+                expires, value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires != None and expires < time.time():
+                # expired; leave it out
+                self.misses += 1
+                return default
+
+            # re-insert to mark as most recently used
+            self._entries[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    # store a value, evicting the least recently used entries
+    # if we're over size
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # counters, as a dict
+    def stats(self):
+        return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+from sculpt.ajax.stats import emit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#
+# AJAX response compression
+#
+# AJAX responses compress very well (repeated markup, labels and
+# error messages) but enabling GZipMiddleware compresses the whole
+# site. Instead, AjaxView can compress just its own responses. Set
+# SCULPT_AJAX_COMPRESSION to a dict with these optional keys:
+#
+#   min_size        responses smaller than this many bytes are
+#                   sent as they are (default 1024)
+#   brotli          use brotli when the client accepts it and the
+#                   brotli package is installed (default True)
+#   brotli_quality  brotli quality, 0-11 (default 5; the higher
+#                   levels are too slow for per-request use)
+#
+# (an empty dict enables compression with the defaults). A view
+# can override this with its compression attribute: False turns
+# compression off for that view, a dict replaces individual
+# options.
+#
+# The encoding is negotiated with Accept-Encoding; brotli is
+# preferred over gzip when both are acceptable. Each compressed
+# response is reported as a response_compressed event (see
+# sculpt.ajax.stats) with the encoding and the original and
+# compressed sizes.
+#
+# NOTE: streaming responses are always gzip-compressed, as they
+# are produced, and no sizes are reported for them.
+#
+
+DEFAULT_OPTIONS = {
+        'min_size': 1024,
+        'brotli': True,
+        'brotli_quality': 5,
+    }
+
+# the compression options for a view, or None if compression
+# is off
+def get_compression_options(view_options = None):
+    options = getattr(settings, 'SCULPT_AJAX_COMPRESSION', None)
+    if view_options is False:
+        return None
+    if view_options != None:
+        options = dict(options or {}, **view_options)
+    if options == None or options is False:
+        return None
+    return dict(DEFAULT_OPTIONS, **options)
+
+# the encodings the client accepts, as a dict of encoding -> q
+def parse_accept_encoding(header):
+    accepted = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[encoding] = q
+    return accepted
+
+# pick the encoding to use, or None
+def choose_encoding(request, options, streaming = False):
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    wildcard = accepted.get('*', 0.0)
+
+    candidates = [ 'gzip' ]
+    if options['brotli'] and brotli != None and not streaming:
+        candidates.insert(0, 'br')
+
+    best = None
+    best_q = 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+# compress a response in place, if that's worthwhile; returns
+# the response
+def compress_response(request, response, options):
+    if options == None or response.has_header('Content-Encoding'):
+        return response
+    if response.status_code != 200:
+        return response
+
+    # whatever we decide, the response depends on the header
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    if response.streaming:
+        if choose_encoding(request, options, streaming = True) == 'gzip':
+            response.streaming_content = compress_sequence(response.streaming_content)
+            response['Content-Encoding'] = 'gzip'
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        return response
+
+    original_size = len(response.content)
+    if original_size < options['min_size']:
+        return response
+
+    encoding = choose_encoding(request, options)
+    if encoding == 'br':
+        compressed = brotli.compress(response.content, quality = options['brotli_quality'])
+    elif encoding == 'gzip':
+        compressed = compress_string(response.content)
+    else:
+        return response
+
+    if len(compressed) >= original_size:
+        # not worth it
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    emit('response_compressed', path = request.path, encoding = encoding, original_size = original_size, compressed_size = len(compressed))
+    return response
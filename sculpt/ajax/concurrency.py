@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone, translation
+
+from multiprocessing.pool import ThreadPool
+
+import os
+import sys
+import threading
+
+#
+# concurrent rendering
+#
+# Update templates that run slow queries (usually through lazy
+# querysets in the context) spend most of their time waiting on
+# the database, so rendering several of them at once can cut a
+# response's time to that of the slowest. This is opt-in, per
+# view (see AjaxResponseView.concurrent_updates), and needs
+# SCULPT_AJAX_CONCURRENT_RENDERING, a dict with these optional
+# keys:
+#
+#   threads             size of the shared thread pool
+#                       (default 4)
+#   max_per_request     most templates one request renders at
+#                       once (default: threads)
+#
+# The pool is shared by all requests in the process and is
+# created on first use; if the process forks (as pre-forking
+# servers do after loading the app) the child builds its own.
+#
+# Each task runs with its own copy of the template context, and
+# closes the database connections its thread opened when it's
+# done, so no connection is shared between threads and none are
+# leaked. An exception in any task is raised again in the
+# requesting thread, with its original traceback, so AjaxView's
+# usual error handling applies. The requesting thread's active
+# language and time zone (which are per thread) are activated in
+# the worker for each task.
+#
+# NOTE: the worker threads have their own database connections,
+# so they can't see changes the request has made inside a
+# transaction that hasn't been committed yet. When the request's
+# connection is in an atomic block (including ATOMIC_REQUESTS),
+# rendering is done in the requesting thread instead.
+#
+# NOTE: each task's copy of the context is shallow, so the
+# objects in it (lazy querysets in particular) are shared by
+# the tasks. A queryset that isn't thread-safe to evaluate must
+# not be used by more than one concurrently rendered template;
+# give each template its own, or evaluate it before rendering.
+#
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# the options, or None if concurrent rendering is off
+def get_options():
+    options = getattr(settings, 'SCULPT_AJAX_CONCURRENT_RENDERING', None)
+    if options == None or options is False:
+        return None
+    threads = options.get('threads', 4)
+    return {
+            'threads': threads,
+            'max_per_request': options.get('max_per_request', threads),
+        }
+
+# the shared pool, (re)built if this process doesn't have one
+def get_pool(threads):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool == None or _pool_pid != os.getpid():
+            # after a fork the parent's pool threads don't exist
+            # in the child; just abandon it
+            _pool = ThreadPool(threads)
+            _pool_pid = os.getpid()
+        return _pool
+
+# whether work can be moved to other threads right now
+def can_run_concurrently():
+    if get_options() == None:
+        return False
+    for connection in connections.all():
+        if connection.in_atomic_block:
+            return False
+    return True
+
+# run one task in a worker thread, with the requesting thread's
+# language and time zone
+def _run_task(function, args, semaphore, language, current_timezone):
+    try:
+        if language != None:
+            translation.activate(language)
+        timezone.activate(current_timezone)
+        return (True, function(*args))
+    except Exception:
+        return (False, sys.exc_info())
+    finally:
+        translation.deactivate()
+        timezone.deactivate()
+        connections.close_all()
+        semaphore.release()
+
+# call each of a list of (function, args) in the pool, no more
+# than max_per_request at once, and return the results in order;
+# if any of them raised an exception, the first (in list order)
+# is raised again here
+def run_concurrently(tasks):
+    options = get_options()
+    pool = get_pool(options['threads'])
+    semaphore = threading.BoundedSemaphore(options['max_per_request'])
+    language = translation.get_language()
+    current_timezone = timezone.get_current_timezone()
+
+    pending = []
+    for function, args in tasks:
+        semaphore.acquire()
+        pending.append(pool.apply_async(_run_task, (function, args, semaphore, language, current_timezone)))
+
+    results = [ async_result.get() for async_result in pending ]
+    for succeeded, value in results:
+        if not succeeded:
+            raise value[0], value[1], value[2]
+    return [ value for succeeded, value in results ]
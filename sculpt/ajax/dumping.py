@@ -0,0 +1,278 @@
+from django.conf import settings
+from django.utils.encoding import force_text
+
+import json
+import logging
+import os
+import Queue
+import random
+import sys
+import threading
+import time
+import traceback
+import urllib
+import urlparse
+
+#
+# AJAX request/response dumping
+#
+# With SCULPT_DUMP_AJAX on, AjaxView.dispatch records each wrapped
+# request and its outcome. To make that usable under load, the
+# request thread does as little as possible: it decides whether
+# this request is sampled, grabs references to the data, and hands
+# a record to the logging system, where a queue handler passes it
+# to a background thread. Redaction, truncation and formatting
+# (as a single line of JSON) all happen on that thread, when the
+# record is finally written.
+#
+# Records go to the sculpt.ajax.dump logger; configure handlers
+# for it in LOGGING as usual. If no logging is configured at all,
+# records are written to standard output as before.
+#
+# Configure the dumping with SCULPT_AJAX_DUMP, a dict with these
+# optional keys:
+#
+#   sample_rate             fraction of requests dumped (default 1.0)
+#   view_sample_rates       dict of view class (dotted path) ->
+#                           sample rate, replacing sample_rate for
+#                           those views; views can also set their
+#                           dump_sample_rate attribute
+#   outcome_sample_rates    dict of outcome -> sample rate, applied
+#                           on top of the view's rate (default 1.0)
+#   max_body                longest request or response body kept,
+#                           in characters (default 2048)
+#   redact                  field names (case-insensitive) whose
+#                           values are replaced in request and
+#                           response data (default: passwords,
+#                           tokens and CSRF values; see
+#                           DEFAULT_REDACT)
+#   queue_size              records waiting to be written before
+#                           new ones are dropped (default 10000)
+#
+# The outcomes are success, form_error, error, exception and
+# invalid (a view returned something other than an AJAX response),
+# so for example:
+#
+#   SCULPT_AJAX_DUMP = {
+#           'outcome_sample_rates': { 'success': 0.01 },
+#       }
+#
+# keeps every failure and 1% of the successes.
+#
+
+DEFAULT_REDACT = [ 'password', 'password1', 'password2', 'password_again', 'csrfmiddlewaretoken', 'token', 'secret', 'api_key', 'credit_card', 'card_number', 'cvv' ]
+
+REDACTED = '********'
+
+# the options, with defaults filled in; read once
+_options = None
+
+def get_options():
+    global _options
+    if _options == None:
+        options = getattr(settings, 'SCULPT_AJAX_DUMP', {})
+        _options = {
+                'sample_rate': options.get('sample_rate', 1.0),
+                'view_sample_rates': options.get('view_sample_rates', {}),
+                'outcome_sample_rates': options.get('outcome_sample_rates', {}),
+                'max_body': options.get('max_body', 2048),
+                'redact': frozenset([ name.lower() for name in options.get('redact', DEFAULT_REDACT) ]),
+                'queue_size': options.get('queue_size', 10000),
+            }
+    return _options
+
+#
+# the queue handler
+#
+
+# a logging handler that hands records to a background thread,
+# which passes them on to another logger's handlers; emit() only
+# ever puts a record on a bounded queue, and drops it (counting
+# the drops) if the queue is full
+class QueueHandler(logging.Handler):
+
+    def __init__(self, target, queue_size = 10000):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.queue = Queue.Queue(queue_size)
+        self.dropped = 0
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+
+    def emit(self, record):
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+
+    # start the background thread, or start it again in a
+    # child process (threads don't survive a fork)
+    def _ensure_thread(self):
+        if self._thread != None and self._thread_pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread == None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target = self._run, name = 'sculpt-ajax-dump')
+                self._thread.daemon = True
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        target = logging.getLogger(self.target)
+        while True:
+            record = self.queue.get()
+            try:
+                target.handle(record)
+            except Exception:
+                self.handleError(record)
+
+# the logger the request thread writes to; created on first use
+_queue_logger = None
+_queue_logger_lock = threading.Lock()
+
+def get_queue_logger():
+    global _queue_logger
+    if _queue_logger == None:
+        with _queue_logger_lock:
+            if _queue_logger == None:
+                output = logging.getLogger('sculpt.ajax.dump')
+                if output.level == logging.NOTSET:
+                    output.setLevel(logging.INFO)
+                if not output.handlers and not logging.getLogger().handlers:
+                    # nothing configured; keep the old behaviour
+                    output.addHandler(logging.StreamHandler(sys.stdout))
+
+                logger = logging.getLogger('sculpt.ajax.dump.queue')
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(QueueHandler('sculpt.ajax.dump', get_options()['queue_size']))
+                _queue_logger = logger
+    return _queue_logger
+
+#
+# the records
+#
+
+# a dump record; holds references to the request and response
+# data and only does the work of turning them into text when the
+# log record is formatted (on the background thread)
+class AjaxDumpRecord(object):
+
+    def __init__(self, options, **data):
+        self.options = options
+        self.data = data
+
+    def __str__(self):
+        data = self.data
+        formatted = {
+                'view': data['view'],
+                'method': data['method'],
+                'uri': data['uri'],
+                'outcome': data['outcome'],
+                'duration_ms': round(data['duration'] * 1000, 1),
+                'request': self.format_request(data['request']),
+            }
+        if data.get('response') != None:
+            formatted['response'] = self.format_body(data['response'], 'application/json')
+        if data.get('note') != None:
+            formatted['note'] = data['note']
+        if data.get('exc_info') != None:
+            formatted['backtrace'] = ''.join(traceback.format_exception(*data['exc_info']))
+        return json.dumps(formatted, default = force_text, sort_keys = True)
+
+    def format_request(self, request_data):
+        formatted = {}
+        if 'post' in request_data:
+            formatted['post'] = self.redact(request_data['post'])
+        if 'files' in request_data:
+            formatted['files'] = request_data['files']
+        if 'body' in request_data:
+            formatted['body'] = self.format_body(request_data['body'], request_data['content_type'])
+        return formatted
+
+    # a body, redacted if we can understand it, and truncated
+    def format_body(self, body, content_type):
+        if isinstance(body, dict):
+            body = json.dumps(self.redact(body), default = force_text)
+        elif content_type.startswith('application/json'):
+            try:
+                body = json.dumps(self.redact(json.loads(body)), default = force_text)
+            except ValueError:
+                pass
+        elif content_type.startswith('application/x-www-form-urlencoded'):
+            fields = urlparse.parse_qsl(body, keep_blank_values = True)
+            body = urllib.urlencode([ (k, REDACTED if k.lower() in self.options['redact'] else v) for k, v in fields ])
+        return self.truncate(force_text(body, errors = 'replace'))
+
+    # replace the values of sensitive fields, at any depth
+    def redact(self, value):
+        if isinstance(value, dict):
+            redacted = {}
+            for k, v in value.iteritems():
+                if isinstance(k, basestring) and k.lower() in self.options['redact']:
+                    redacted[k] = REDACTED
+                else:
+                    redacted[k] = self.redact(v)
+            return redacted
+        if isinstance(value, list):
+            return [ self.redact(v) for v in value ]
+        return value
+
+    def truncate(self, text):
+        max_body = self.options['max_body']
+        if len(text) <= max_body:
+            return text
+        return text[:max_body] + '... (%d more)' % (len(text) - max_body)
+
+# the sample rate for a view and outcome
+def get_sample_rate(view, outcome, options):
+    rate = getattr(view, 'dump_sample_rate', None)
+    if rate == None:
+        view_name = view.__class__.__module__ + '.' + view.__class__.__name__
+        rate = options['view_sample_rates'].get(view_name, options['sample_rate'])
+    return rate * options['outcome_sample_rates'].get(outcome, 1.0)
+
+# the request data worth keeping, by reference
+def capture_request(request):
+    content_type = request.META.get('CONTENT_TYPE', '')
+    if content_type.startswith('multipart/form-data'):
+        # Django has already parsed the body and dumping a
+        # full uploaded file's data will not be helpful
+        return {
+                'post': dict(request.POST.lists()),
+                'files': [ '%s: %s' % (name, f.name) for name, f in request.FILES.items() ],
+            }
+    if hasattr(request, '_body'):
+        # we'd like to keep the raw request if we can
+        return { 'body': request._body, 'content_type': content_type }
+    return { 'post': dict(request.POST.lists()) }
+
+# record a wrapped request, if it's sampled
+#
+# response is the response returned (or the dict of an error
+# response we built ourselves), started the time.time() the
+# request began
+#
+def dump_ajax(view, request, outcome, started, response = None, exc_info = None, note = None):
+    options = get_options()
+    rate = get_sample_rate(view, outcome, options)
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+
+    if response != None and not isinstance(response, dict):
+        response = '<streaming>' if response.streaming else response.content
+
+    record = AjaxDumpRecord(options,
+            view = view.__class__.__module__ + '.' + view.__class__.__name__,
+            method = request.method,
+            uri = request.META.get('RAW_URI', request.META.get('PATH_INFO')),
+            outcome = outcome,
+            duration = time.time() - started,
+            request = capture_request(request),
+            response = response,
+            exc_info = exc_info,
+            note = note,
+        )
+    get_queue_logger().info('%s', record)
@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.utils.encoding import force_text
+
+from sculpt.ajax.stats import emit
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+#
+# exception reporting for AjaxView
+#
+# Outside DEBUG, AjaxView.dispatch logs each exception through the
+# django.request logger (as Django itself does), which usually
+# means an email to the admins. When something breaks for everyone
+# at once, that's the same traceback formatted and mailed for every
+# request, which ties up workers just when they're needed most.
+#
+# With SCULPT_AJAX_EXCEPTION_THROTTLE configured, exceptions are
+# fingerprinted by type and where they happened (the file, function
+# and line of each frame of the traceback), and only the first few
+# of each fingerprint in a window are reported in full. The rest are
+# just counted; when the window is over a single summary is logged
+# (through django.request, without a traceback) saying how many
+# were suppressed, and an exception_summary event is sent to the
+# stats hook. The client gets its AjaxExceptionResponse immediately
+# either way.
+#
+# SCULPT_AJAX_EXCEPTION_THROTTLE may be True, or a dict with these
+# optional keys:
+#
+#   window          seconds each fingerprint's window lasts
+#                   (default 300)
+#   max_reports     exceptions reported in full per fingerprint
+#                   per window (default 1)
+#
+# NOTE: the counts are per process; with several server processes
+# each reports its own first exceptions and summaries.
+#
+
+# the options, or False if throttling is off; read once
+_options = None
+
+def get_options():
+    global _options
+    if _options == None:
+        options = getattr(settings, 'SCULPT_AJAX_EXCEPTION_THROTTLE', False)
+        if not options:
+            _options = False
+        else:
+            if options is True:
+                options = {}
+            _options = {
+                    'window': options.get('window', 300),
+                    'max_reports': options.get('max_reports', 1),
+                }
+    return _options
+
+# a fingerprint for an exception: its type and the location of
+# each frame in its traceback (not the message, which often has
+# ids or values in it)
+#
+# NOTE: this walks the traceback directly rather than using the
+# traceback module, which would look up source lines
+#
+def fingerprint_exception(exc_info):
+    exc_type, exc_value, tb = exc_info
+    parts = [ exc_type.__module__ + '.' + exc_type.__name__ ]
+    while tb != None:
+        code = tb.tb_frame.f_code
+        parts.append('%s:%s:%d' % (code.co_filename, code.co_name, tb.tb_lineno))
+        tb = tb.tb_next
+    return hashlib.md5('\n'.join(parts)).hexdigest()[:12]
+
+# one fingerprint's window
+class _Window(object):
+
+    def __init__(self, title, path, started):
+        self.title = title          # the first exception's type and message
+        self.path = path            # the first exception's request path
+        self.started = started
+        self.reported = 0
+        self.suppressed = 0
+
+# the windows, by fingerprint, and the thread that summarizes them
+# when they end
+_windows = {}
+_windows_lock = threading.Lock()
+_flusher = None
+_flusher_pid = None
+
+# log an exception the way Django does
+def _log_exception(request, exc_info, fingerprint = None):
+    logger = logging.getLogger('django.request')
+    message = 'Internal Server Error: %s'
+    args = [ request.path ]
+    if fingerprint != None:
+        message += ' (fingerprint %s)'
+        args.append(fingerprint)
+    logger.error(message, *args,
+        exc_info = exc_info,
+        extra = {
+            'status_code': 500,
+            'request': request,
+        }
+    )
+
+# log the summary of a window that suppressed exceptions
+def _log_summary(fingerprint, window, now):
+    logger = logging.getLogger('django.request')
+    logger.error('Suppressed %d repeats of %s (fingerprint %s, first at %s) in the last %d seconds',
+        window.suppressed, window.title, fingerprint, window.path, now - window.started,
+        extra = {
+            'status_code': 500,
+        }
+    )
+    emit('exception_summary',
+            fingerprint = fingerprint,
+            title = window.title,
+            path = window.path,
+            reported = window.reported,
+            suppressed = window.suppressed,
+        )
+
+# end the windows that are over, returning those with suppressed
+# exceptions to summarize; call with _windows_lock held
+def _expire_windows(now, window_length):
+    expired = []
+    for fingerprint, window in _windows.items():
+        if now - window.started >= window_length:
+            del _windows[fingerprint]
+            if window.suppressed:
+                expired.append((fingerprint, window))
+    return expired
+
+# summarize windows as they end, until there are none left
+def _run_flusher(window_length):
+    global _flusher
+    finished = False
+    while not finished:
+        time.sleep(window_length / 4.0)
+        now = time.time()
+        with _windows_lock:
+            expired = _expire_windows(now, window_length)
+            if not _windows:
+                _flusher = None
+                finished = True
+        for fingerprint, window in expired:
+            _log_summary(fingerprint, window, now)
+
+# start the summarizing thread if it isn't running in this process
+# (threads don't survive a fork); call with _windows_lock held
+def _ensure_flusher(window_length):
+    global _flusher, _flusher_pid
+    if _flusher != None and _flusher_pid == os.getpid():
+        return
+    _flusher = threading.Thread(target = _run_flusher, args = (window_length,), name = 'sculpt-ajax-exceptions')
+    _flusher.daemon = True
+    _flusher_pid = os.getpid()
+    _flusher.start()
+
+# report an exception caught by AjaxView, throttled if that's
+# configured
+def report_exception(request, exc_info):
+    options = get_options()
+    if not options:
+        _log_exception(request, exc_info)
+        return
+
+    fingerprint = fingerprint_exception(exc_info)
+    now = time.time()
+    ended = None
+    with _windows_lock:
+        window = _windows.get(fingerprint)
+        if window == None or now - window.started >= options['window']:
+            if window != None and window.suppressed:
+                # the flusher hasn't got to it yet
+                ended = window
+            window = _Window('%s: %s' % (exc_info[0].__name__, force_text(exc_info[1], errors = 'replace')), request.path, now)
+            _windows[fingerprint] = window
+            _ensure_flusher(options['window'])
+        if window.reported < options['max_reports']:
+            window.reported += 1
+            report = True
+        else:
+            window.suppressed += 1
+            report = False
+
+    if ended != None:
+        _log_summary(fingerprint, ended, now)
+    if report:
+        _log_exception(request, exc_info, fingerprint)
@@ -41,7 +41,21 @@ error_messages = {
                 'max_value': '__fieldname__ must be no more than %(limit_value)s.',
                 'required': '__fieldname__ is required.',
                 
+                # inter-field rules (see EnhancedValidationMixin); these
+                # are form-wide, so use labels rather than __fieldname__
+                'misordered': '%(fieldname1)s must come before %(fieldname2)s.',
                 'nomatch': '%(fieldname1)s and %(fieldname2)s must match.',
+                'notunique': '%(fieldnames)s must all be different.',
+                'too_few_fields': (
+                        'At least one of %(fieldnames)s is required.',
+                        'At least %(min_required)d of %(fieldnames)s are required.',
+                        'min_required',
+                    ),
+                'too_many_fields': (
+                        'No more than one of %(fieldnames)s may be given.',
+                        'No more than %(max_allowed)d of %(fieldnames)s may be given.',
+                        'max_allowed',
+                    ),
                 
                 # type-specific error messages
                 'ChoiceField__invalid_choice': '__fieldname__ does not have a valid choice.',       # Django's version of this message echoes back the user selection. We decline. This error shouldn't happen anyway (choice fields use drop-downs...)
@@ -1,10 +1,18 @@
 from django import forms
 from django.conf import settings
-from django.utils.translation import ungettext_lazy
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxLengthValidator, MinLengthValidator, MaxValueValidator, MinValueValidator, RegexValidator
+from django.utils.encoding import force_text
+from django.utils.translation import get_language, override, ungettext, ungettext_lazy
 
+from sculpt.ajax.caching import LRUCache
 from sculpt.common import merge_dicts, Enumeration
 
+import hashlib
 import importlib
+import json
+import types
 
 #
 # forms and support code
@@ -22,6 +30,186 @@ def collect_error_messages():
 
 error_messages = collect_error_messages()
 
+# a flattened, indexed view of the collected error messages
+#
+# The nested error_messages dict is easy to write but slow to
+# search: every lookup builds keys like fieldclass__code and
+# probes several dicts, once per class in the field's MRO. The
+# catalog splits those keys apart once, at startup, into two
+# flat indexes keyed by tuples:
+#
+#   form_index      (form name, field name, code); field name
+#                   is None for form-wide messages
+#   global_index    (field class name, code); field class name
+#                   is None for classless messages
+#
+# and memoizes each resolved lookup, keyed by (form name, field
+# name, field class, code), so the fallback chain is walked only
+# the first time a combination is seen; after that a lookup is a
+# single hash hit.
+#
+# NOTE: find() returns None when there is no message; callers
+# are expected to complain loudly (see AjaxForm._find_error_message)
+#
+# Every message also has a catalog key, "section:error_id" (e.g.
+# "_global:CharField__max_length"), which is how the client-side
+# copy of the catalog identifies it; see get_client_catalog.
+#
+class ErrorMessageCatalog(object):
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.form_index = {}
+        self.global_index = {}
+        self.resolved = {}
+        self._client_catalogs = {}
+
+        for section, section_messages in messages.iteritems():
+            for error_id, message in section_messages.iteritems():
+                # prefix is a field class name in _global and a
+                # field name elsewhere; codes never contain a
+                # double underscore, so split from the right
+                prefix, sep, code = error_id.rpartition('__')
+                if not sep:
+                    prefix = None
+                entry = (section + ':' + error_id, message)
+                if section == '_global':
+                    self.global_index[(prefix, code)] = entry
+                else:
+                    self.form_index[(section, prefix, code)] = entry
+
+    # find the message for a code raised on a field of a
+    # particular class, on a particular form; field_name and
+    # field_class may be None for form-wide (__all__) messages
+    def find(self, form_name, field_name, field_class, code):
+        entry = self.find_entry(form_name, field_name, field_class, code)
+        return entry[1] if entry is not None else None
+
+    # as find, but return the message's catalog key
+    def find_key(self, form_name, field_name, field_class, code):
+        entry = self.find_entry(form_name, field_name, field_class, code)
+        return entry[0] if entry is not None else None
+
+    # as find, but return (catalog key, message)
+    def find_entry(self, form_name, field_name, field_class, code):
+        key = (form_name, field_name, field_class, code)
+        try:
+            return self.resolved[key]
+        except KeyError:
+            pass
+
+        entry = self._resolve(form_name, field_name, field_class, code)
+        if entry is not None:
+            # only successful lookups are remembered; misses
+            # are programming errors and should keep failing
+            self.resolved[key] = entry
+        return entry
+
+    # walk the full fallback chain: form-specific field-specific,
+    # form-specific form-wide, then _global for each class in the
+    # field's MRO, and finally the classless _global message
+    def _resolve(self, form_name, field_name, field_class, code):
+        if field_name is not None:
+            entry = self.form_index.get((form_name, field_name, code))
+            if entry is not None:
+                return entry
+
+        entry = self.form_index.get((form_name, None, code))
+        if entry is not None:
+            return entry
+
+        if field_class is not None:
+            for klass in field_class.__mro__:
+                entry = self.global_index.get((klass.__name__, code))
+                if entry is not None:
+                    return entry
+
+        return self.global_index.get((None, code))
+
+    # whether a message is in the client's catalog: plural
+    # messages are chosen on the client by the English rule
+    # (singular for a count of 1), which is only right when
+    # translation is off; otherwise they're sent in full
+    @staticmethod
+    def is_client_message(message):
+        return not (isinstance(message, tuple) and settings.USE_I18N)
+
+    # the catalog as the client sees it, in a language (the
+    # active one by default): (version, JSON), where the JSON is
+    # {"version": ..., "language": ..., "messages": {key: message}};
+    # plural messages are [singular, plural, count parameter]
+    # lists, which Sculpt.format_message understands
+    #
+    # Messages are translated into the language (lazy messages
+    # are translated as they're built). The version is a hash of
+    # the language and the messages, so it changes whenever they
+    # do and the client's copy can be cached indefinitely under
+    # a versioned URL.
+    #
+    def get_client_catalog(self, language = None):
+        if language == None:
+            language = get_language() or settings.LANGUAGE_CODE
+        catalog = self._client_catalogs.get(language)
+        if catalog is None:
+            client_messages = {}
+            with override(language):
+                for index in [ self.global_index, self.form_index ]:
+                    for catalog_key, message in index.itervalues():
+                        if not self.is_client_message(message):
+                            continue
+                        if isinstance(message, tuple):
+                            client_messages[catalog_key] = [ force_text(part) for part in message ]
+                        else:
+                            client_messages[catalog_key] = force_text(message)
+            messages_json = json.dumps(client_messages, sort_keys = True, separators = (',', ':'))
+            version = hashlib.sha1(language + ':' + messages_json).hexdigest()[:12]
+            catalog = (version, '{"version":"%s","language":%s,"messages":%s}' % (version, json.dumps(language), messages_json))
+            self._client_catalogs[language] = catalog
+        return catalog
+
+error_message_catalog = ErrorMessageCatalog(error_messages)
+
+# the URL of the client-side catalog in the active language when
+# compact form errors are enabled (set
+# SCULPT_AJAX_COMPACT_FORM_ERRORS = True and include
+# sculpt.ajax.urls), or None; forms tell the client where to load
+# it from, and the client tells us which version it has (see
+# sculpt.ajax.responses.accepts_compact_form_errors)
+_error_catalog_urls = {}
+
+def get_error_catalog_url():
+    if not getattr(settings, 'SCULPT_AJAX_COMPACT_FORM_ERRORS', False):
+        return None
+    language = get_language() or settings.LANGUAGE_CODE
+    url = _error_catalog_urls.get(language)
+    if url == None:
+        from django.core.urlresolvers import reverse
+        version = error_message_catalog.get_client_catalog(language)[0]
+        url = reverse('sculpt_ajax_error_catalog', kwargs = { 'language': language, 'version': version })
+        _error_catalog_urls[language] = url
+    return url
+
+# the cache of cleaned field values shared by all forms that
+# enable partial_validation_cache (see EnhancedValidationMixin);
+# created on first use from SCULPT_AJAX_PARTIAL_VALIDATION_CACHE,
+# a dict with these optional keys:
+#
+#   max_entries     most field results kept (default 10000)
+#   ttl             seconds a result is kept (default 300)
+#
+_partial_validation_cache = None
+
+def get_partial_validation_cache():
+    global _partial_validation_cache
+    if _partial_validation_cache == None:
+        options = getattr(settings, 'SCULPT_AJAX_PARTIAL_VALIDATION_CACHE', {})
+        _partial_validation_cache = LRUCache(options.get('max_entries', 10000), options.get('ttl', 300))
+    return _partial_validation_cache
+
+# how many field layouts each form class remembers the order of
+# (see EnhancedValidationMixin.field_order)
+FIELD_ORDER_CACHE_SIZE = 100
+
 # CrispyForms mixin boilerplate
 #
 class CrispyMixin(object):
@@ -51,9 +239,10 @@ class CrispyMixin(object):
 #      to verify relationships between fields (ordering,
 #      dependency, etc.).
 #
-#      To use inter-field validation, define a form clean
-#      method and invoke the rule methods to do the
-#      validation and generate appropriate error messages.
+#      To use inter-field validation, either list the rules
+#      in validation_rules or define a form clean method and
+#      invoke the rule methods to do the validation and
+#      generate appropriate error messages.
 #      To override error messages, define a name for the
 #      rule and include the error message in the usual
 #      place.
@@ -72,6 +261,78 @@ class EnhancedValidationMixin(object):
     # we get a multi-field error that touches any field we
     # aren't validating, we ignore it
     _partial_validation_field_set = None
+
+    # and the position of the last field being validated
+    _partial_validation_position = None
+
+    # declarative inter-field rules, applied after clean(); a
+    # list of tuples giving the rule method name and its
+    # arguments, e.g.
+    #
+    #   validation_rules = [
+    #           ('require_match', 'rule1', [ 'password', 'password_again' ]),
+    #           ('require_fields', 'rule2', [ 'phone', 'email' ], 1),
+    #           ('require_ordering', 'rule3', [ FF('start_date'), FF('end_date') ]),
+    #       ]
+    #
+    # see the multi-field rules below, and apply_validation_rules
+    validation_rules = None
+
+    # by default, partial validation cleans EVERY field and then
+    # throws away the errors for fields after the last field; set
+    # this to True to only clean the fields up to and including
+    # the last field, so that expensive validators (especially
+    # ones that hit the database) on later fields are skipped
+    #
+    # NOTE: with this enabled, fields after the last field will
+    # not appear in cleaned_data during partial validation, so
+    # clean() and clean_<field> methods must use
+    # are_fields_present() (or are_fields_valid()) before
+    # touching them; properly-guarded code produces exactly the
+    # same errors either way
+    incremental_partial_validation = False
+
+    # the fields the form-level clean() method depends on; during
+    # incremental partial validation, clean() is skipped entirely
+    # unless all of these are present (see are_fields_present).
+    # None means "unknown" and clean() always runs.
+    clean_depends_on = None
+
+    # partial validation re-submits the whole form every time the
+    # user leaves a field, so the same unchanged values get
+    # cleaned over and over; set this to True to remember each
+    # field's result (cleaned value or error) between partial
+    # validation requests from the same session, keyed by a hash
+    # of the field's raw value
+    #
+    # Only the field's own clean() (to_python, validate and its
+    # validators) is skipped; clean_<field> methods on the form
+    # always run, since they may depend on other fields. Full
+    # validation never uses the cache.
+    #
+    # The key includes the field's configuration (required, its
+    # validators and limits, its choices; see
+    # _get_field_signature), so a field changed per request (in
+    # prepare_form, say) doesn't reuse another configuration's
+    # results. Fields with a queryset (ModelChoiceField and the
+    # like) are never cached, since the queryset can't be
+    # compared cheaply; neither are file fields.
+    #
+    # NOTE: the cache is per-process and bounded in both size and
+    # age; see get_partial_validation_cache
+    #
+    # NOTE: cleaned values are shared between requests, so don't
+    # modify mutable cleaned values (lists, dicts) in place
+    partial_validation_cache = False
+
+    # names of fields whose validators depend on mutable state
+    # (e.g. "is this username taken?") and must never be cached
+    partial_validation_cache_exclude = ()
+
+    # the scope (normally the session key) the cached results
+    # belong to; set by the view, and caching is skipped if this
+    # is None
+    partial_validation_cache_scope = None
     
     # a convenient property to determine if partial validation
     # is currently being performed; if you have validation
@@ -107,28 +368,24 @@ class EnhancedValidationMixin(object):
     # core partial validation
     def partially_validate(self, last_field):
         
-        # step 1. the last_field as given to us may be
-        # prefixed, so unprefix it
-        if self.prefix != None and last_field.startswith(self.prefix+'-'):
-            last_field = last_field[len(self.prefix)+1:]
-        
-        # step 1. identify all the fields up to, and
-        # including, the last field to validate
-        full_field_list = self.fields.keys()
-        if last_field not in full_field_list:
+        # step 1. find the position of the last field (which
+        # may be prefixed) and identify all the fields up to,
+        # and including, it
+        order = self.field_order
+        position = order.position(last_field)
+        if position == None:
             # this can happen if the user is focused on a
             # submit button; rather than completely choke,
             # we just assume (perhaps erroneously) that
             # the user has completed all fields
-            field_list = full_field_list
-        else:
-            # extract the list up to and including the
-            # last field
-            field_list = full_field_list[:full_field_list.index(last_field)+1]  # raises ValueError if last_field is not in the list
-        
-        self._partial_validation_field_set = set(field_list)
+            position = len(order.names) - 1
+
+        self._partial_validation_field_set = order.names_through(position)
+        self._partial_validation_position = position
         
         # step 2. do all the validation normally
+        # (or, with incremental_partial_validation, just
+        # for the fields in the set; see _clean_fields)
         # this will invoke the form's clean() method,
         # which may contain inter-field validation,
         # but those routines should be testing to make
@@ -141,13 +398,177 @@ class EnhancedValidationMixin(object):
         # NOTE: if the partial list in fact includes the
         # full set of fields, this loop has zero iterations
         # and all error messages are preserved
-        for i in range(len(field_list), len(full_field_list)):
-            field = full_field_list[i]
+        for field in order.names[position+1:]:
             if field in self._errors:
                 del self._errors[field]
 
         # clean up the partial validation state
         self._partial_validation_field_set = None
+        self._partial_validation_position = None
+
+    # given several field names (bare or prefixed), find the
+    # one farthest into the form; this is used when the client
+    # batches several fields into one partial validation request
+    #
+    # NOTE: returns the bare field name; if any of the names is
+    # not a field (e.g. a submit button) that name is returned
+    # as-is, which partially_validate treats as "all fields"
+    #
+    def find_last_field(self, field_names):
+        order = self.field_order
+        last_field = None
+        last_position = -1
+        for name in field_names:
+            position = order.position(name)
+            if position == None:
+                return name
+            if position > last_position:
+                last_field = order.names[position]
+                last_position = position
+        return last_field
+
+    # the order of the fields on this form (see FieldOrder);
+    # computed once per form class and field layout, and
+    # remembered on the instance
+    #
+    # NOTE: forms which add, remove or reorder fields in
+    # __init__ simply get a different (also cached) index; the
+    # cache is bounded, so forms with endlessly varying fields
+    # or prefixes only cost recomputation
+    #
+    @property
+    def field_order(self):
+        order = self.__dict__.get('_field_order')
+        if order == None:
+            cache = self.__class__.__dict__.get('_field_order_cache')
+            if cache == None:
+                cache = LRUCache(FIELD_ORDER_CACHE_SIZE)
+                self.__class__._field_order_cache = cache
+
+            key = (tuple(self.fields), self.prefix)
+            order = cache.get(key)
+            if order == None:
+                order = FieldOrder(key[0], self.prefix)
+                cache.set(key, order)
+            self._field_order = order
+        return order
+
+    # Django's field cleaning loop; during incremental partial
+    # validation only the fields in the partial validation set
+    # are cleaned
+    #
+    # NOTE: self.fields is left alone, so that anything that
+    # looks at it while cleaning (clean_<field> methods, add_error,
+    # field-dependent widgets) still sees every field
+    #
+    def _clean_fields(self):
+        if self._partial_validation_field_set == None:
+            return super(EnhancedValidationMixin, self)._clean_fields()
+
+        use_cache = self.partial_validation_cache and self.partial_validation_cache_scope != None
+        if not self.incremental_partial_validation and not use_cache:
+            return super(EnhancedValidationMixin, self)._clean_fields()
+
+        if self.incremental_partial_validation:
+            field_set = self._partial_validation_field_set
+        else:
+            field_set = None
+        return self._clean_fields_partial(field_set, use_cache)
+
+    # a copy of Django's field cleaning loop that skips fields
+    # not in field_set (unless it's None) and, with use_cache,
+    # consults the partial validation cache for each field's
+    # own clean()
+    def _clean_fields_partial(self, field_set, use_cache):
+        for name, field in self.fields.iteritems():
+            if field_set != None and name not in field_set:
+                continue
+            if getattr(field, 'disabled', False):
+                value = self.initial.get(name, field.initial)
+            else:
+                value = field.widget.value_from_datadict(self.data, self.files, self.add_prefix(name))
+            try:
+                if isinstance(field, forms.FileField):
+                    # never cached; the raw value is an upload
+                    initial = self.initial.get(name, field.initial)
+                    value = field.clean(value, initial)
+                elif not use_cache or name in self.partial_validation_cache_exclude or hasattr(field, 'queryset'):
+                    value = field.clean(value)
+                else:
+                    value = self._clean_field_cached(name, field, value)
+                self.cleaned_data[name] = value
+                if hasattr(self, 'clean_%s' % name):
+                    value = getattr(self, 'clean_%s' % name)()
+                    self.cleaned_data[name] = value
+            except ValidationError, e:
+                self.add_error(name, e)
+
+    # clean a single field, remembering the outcome
+    def _clean_field_cached(self, name, field, value):
+        cache = get_partial_validation_cache()
+        key = (
+                self.partial_validation_cache_scope,
+                self.__class__.__module__,
+                self.__class__.__name__,
+                name,
+                self._get_field_signature(field),
+                hashlib.sha1(repr(value)).hexdigest(),
+            )
+
+        result = cache.get(key)
+        if result == None:
+            try:
+                result = (True, field.clean(value))
+            except ValidationError, e:
+                result = (False, e)
+            cache.set(key, result)
+
+        is_valid, outcome = result
+        if not is_valid:
+            raise outcome
+        return outcome
+
+    # the parts of a field's configuration that decide what its
+    # clean() accepts, as a hash; choices count by value only,
+    # since labels don't affect validation
+    @staticmethod
+    def _get_field_signature(field):
+        parts = [ field.__class__.__module__, field.__class__.__name__, field.required ]
+        for attr in [ 'max_length', 'min_length', 'max_value', 'min_value', 'max_digits', 'decimal_places', 'input_formats', 'localize', 'coerce', 'empty_value' ]:
+            parts.append(getattr(field, attr, None))
+        for validator in field.validators:
+            if isinstance(validator, types.FunctionType):
+                # a plain function has nothing to compare but itself
+                parts.append(validator)
+                continue
+            parts.append((
+                    validator.__class__.__name__,
+                    getattr(validator, 'limit_value', None),
+                    getattr(getattr(validator, 'regex', None), 'pattern', None),
+                    getattr(validator, 'code', None),
+                ))
+        if hasattr(field, 'choices'):
+            values = []
+            for value, label in field.choices:
+                if isinstance(label, (list, tuple)):
+                    # an option group
+                    values.extend([ v for v, l in label ])
+                else:
+                    values.append(value)
+            parts.append(values)
+        return hashlib.sha1(repr(parts)).hexdigest()
+
+    # Django's form-wide cleaning; during incremental partial
+    # validation this is skipped when clean_depends_on names
+    # fields that are not yet present
+    #
+    # NOTE: declarative rules (validation_rules) are applied
+    # after clean(), whether or not clean() was skipped
+    #
+    def _clean_form(self):
+        if not self.incremental_partial_validation or self.clean_depends_on == None or self.are_fields_present(self.clean_depends_on):
+            super(EnhancedValidationMixin, self)._clean_form()
+        self.apply_validation_rules()
 
     # a helper function that determines whether all of the
     # listed fields are valid; this basically checks to see
@@ -164,6 +585,26 @@ class EnhancedValidationMixin(object):
     # multi-field rules
     #
     
+    # All of the rules below follow the same pattern:
+    #
+    #   - the fields involved are given in field_list; an item
+    #     may be a bare field name or an FF (form field) wrapper,
+    #     except for require_ordering, where bare values are
+    #     literals and fields MUST be wrapped in FF
+    #   - the rule is skipped (and passes) unless all of its
+    #     fields are present (see are_fields_present) and valid
+    #     (see are_fields_valid)
+    #   - on failure, one error message is added to the LAST of
+    #     the rule's fields (in form order), looked up by
+    #     error_name first and by the rule's default code after
+    #     that; see add_multiple_error_messages
+    #   - the return value is False if the rule failed, else True
+    #
+    # The message parameters fieldname1, fieldname2 (labels of
+    # the first two fields/values) and fieldnames (all labels,
+    # as a readable list) are always available.
+    #
+
     # require some (but not all) fields
     # expects:
     #   error_name      name to use for custom error messages;
@@ -174,21 +615,74 @@ class EnhancedValidationMixin(object):
     #   max_allowed     maximum number of fields allowed;
     #                   defaults to len(field_list)
     #
-    def require_fields(self, error_name, field_list, min_required, max_allowed):
-        pass
+    # default codes: too_few_fields, too_many_fields (with
+    # min_required and max_allowed parameters)
+    #
+    def require_fields(self, error_name, field_list, min_required = 1, max_allowed = None):
+        fields = self._rule_fields(field_list)
+        if not self._is_rule_ready(fields):
+            return True
+        if max_allowed == None:
+            max_allowed = len(fields)
+
+        count = 0
+        for name in fields:
+            if self.cleaned_data[name] not in self.fields[name].empty_values:
+                count += 1
+
+        params = { 'min_required': min_required, 'max_allowed': max_allowed }
+        if count < min_required:
+            self._add_rule_error(error_name, 'too_few_fields', fields, field_list, params)
+            return False
+        if count > max_allowed:
+            self._add_rule_error(error_name, 'too_many_fields', fields, field_list, params)
+            return False
+        return True
         
     # require several fields to match
+    # default code: nomatch
     def require_match(self, error_name, field_list):
-        pass
+        return self.require_distinct(error_name, field_list, 1, 1, 'nomatch')
         
     # require unique field values
+    # NOTE: empty values are ignored, so several optional
+    # fields may all be left blank
+    # default code: notunique
     def require_unique(self, error_name, field_list):
-        pass
+        fields = self._rule_fields(field_list)
+        if not self._is_rule_ready(fields):
+            return True
+
+        values = [ self.cleaned_data[name] for name in fields if self.cleaned_data[name] not in self.fields[name].empty_values ]
+        if self._count_distinct(values) < len(values):
+            self._add_rule_error(error_name, 'notunique', fields, field_list)
+            return False
+        return True
         
     # core routine for require_match, require_unique:
     # require a min/max set of unique values
+    # NOTE: all empty values count as the same value
+    # default code: error_type if given, else notunique for
+    # too few distinct values and nomatch for too many
     def require_distinct(self, error_name, field_list, min_distinct, max_distinct, error_type = None):
-        pass
+        fields = self._rule_fields(field_list)
+        if not self._is_rule_ready(fields):
+            return True
+
+        values = []
+        for name in fields:
+            value = self.cleaned_data[name]
+            if value in self.fields[name].empty_values:
+                value = None
+            values.append(value)
+
+        distinct = self._count_distinct(values)
+        if distinct < min_distinct or distinct > max_distinct:
+            if error_type == None:
+                error_type = 'notunique' if distinct < min_distinct else 'nomatch'
+            self._add_rule_error(error_name, error_type, fields, field_list, { 'min_distinct': min_distinct, 'max_distinct': max_distinct })
+            return False
+        return True
         
     # ensure fields are in the correct order
     # you can write this yourself by testing fields but using
@@ -211,10 +705,131 @@ class EnhancedValidationMixin(object):
     # the second range starts after the first ends) and
     # the error messages will make more sense.
     #
+    # NOTE: values must be strictly increasing; empty values
+    # are skipped, so optional fields may be left blank. Only
+    # the first out-of-order pair is reported, with that pair
+    # as fieldname1 and fieldname2.
+    #
+    # default code: misordered
+    #
     #**** TODO: allow equality of values in a controlled way
     #
     def require_ordering(self, error_name, field_list):
-        pass
+        fields = self._rule_fields(field_list, literals = True)
+        if not self._is_rule_ready(fields):
+            return True
+
+        previous = None
+        for item in field_list:
+            if isinstance(item, FF):
+                value = self.cleaned_data[item.field_name]
+                if value in self.fields[item.field_name].empty_values:
+                    continue
+            else:
+                value = item
+
+            if previous != None and not previous[1] < value:
+                pair = [ previous[0], item ]
+                self._add_rule_error(error_name, 'misordered', self._rule_fields(pair, literals = True), pair)
+                return False
+            previous = (item, value)
+
+        return True
+
+    # the field names in a rule's field list
+    def _rule_fields(self, field_list, literals = False):
+        fields = []
+        for item in field_list:
+            if isinstance(item, FF):
+                fields.append(item.field_name)
+            elif not literals:
+                fields.append(item)
+        return fields
+
+    # whether a rule's fields are all present and valid
+    def _is_rule_ready(self, fields):
+        return self.are_fields_present(fields) and self.are_fields_valid(fields)
+
+    # count distinct values without requiring them to be
+    # hashable
+    @staticmethod
+    def _count_distinct(values):
+        distinct = []
+        for value in values:
+            if value not in distinct:
+                distinct.append(value)
+        return len(distinct)
+
+    # report a rule failure; the message is found by error_name
+    # if there's one defined, otherwise by the default code
+    def _add_rule_error(self, error_name, code, fields, field_list, params = None):
+        try:
+            self._find_error_message(None, None, error_name)
+        except KeyError:
+            error_name = code
+        self.add_multiple_error_messages(fields, error_name, self._rule_params(field_list, params))
+
+    # the standard message parameters for a rule
+    def _rule_params(self, field_list, params = None):
+        labels = []
+        for item in field_list:
+            if isinstance(item, FF):
+                labels.append(force_text(self.fields[item.field_name].label))
+            elif item in self.fields:
+                labels.append(force_text(self.fields[item].label))
+            else:
+                labels.append(force_text(item))     # a literal
+
+        rule_params = {
+                'fieldname1': labels[0] if len(labels) > 0 else '',
+                'fieldname2': labels[1] if len(labels) > 1 else '',
+            }
+        if len(labels) > 1:
+            rule_params['fieldnames'] = ', '.join(labels[:-1]) + ' and ' + labels[-1]
+        else:
+            rule_params['fieldnames'] = ''.join(labels)
+        if params:
+            rule_params.update(params)
+        return rule_params
+
+    # run the declarative rules in validation_rules; called after
+    # the form's clean() method
+    #
+    # This is a single pass over the rules. Each rule's fields
+    # (and the position of its last field) are worked out once
+    # per form class and field layout, so during partial
+    # validation the rules that reach past the last field are
+    # skipped with a single comparison, before any of their
+    # fields are even looked at.
+    #
+    def apply_validation_rules(self):
+        if not self.validation_rules:
+            return
+
+        last_position = self._partial_validation_position
+        for max_position, method_name, args in self._get_compiled_rules():
+            if last_position != None and max_position > last_position:
+                continue
+            getattr(self, method_name)(*args)
+
+    # the validation rules, each as (position of last field,
+    # method name, arguments), cached per field layout on the
+    # FieldOrder (which belongs to this form class)
+    def _get_compiled_rules(self):
+        order = self.field_order
+        compiled = order.compiled_rules
+        if compiled == None:
+            compiled = []
+            for rule in self.validation_rules:
+                method_name, args = rule[0], tuple(rule[1:])
+                field_list = args[1]
+                fields = self._rule_fields(field_list, literals = (method_name == 'require_ordering'))
+                positions = [ order.position(name) for name in fields ]
+                if None in positions:
+                    raise KeyError('Validation rule %s on form %s refers to an unknown field' % (args[0], self.__class__.__name__))
+                compiled.append((max(positions) if positions else -1, method_name, args))
+            order.compiled_rules = compiled
+        return compiled
 
     # a helper function which determines if a set of fields
     # are all included in the partial validation list; this
@@ -240,11 +855,88 @@ class EnhancedValidationMixin(object):
                 
         return True        
     
-    # add an error message to multiple fields at once
+    # add an error message that concerns multiple fields at once
+    #
+    # The message is looked up like any other (form-specific
+    # first, then _global) but as a form-wide message, since it
+    # doesn't belong to any one field; it's expanded with params
+    # (plural messages are resolved here) and attached to the
+    # LAST of the fields in form order, so that it's presented
+    # after all the fields it refers to.
+    #
+    # NOTE: this relies on AjaxForm's message lookup
+    #
     def add_multiple_error_messages(self, field_list, code, params = None):
-        pass
+        message = self._find_error_message(None, None, code)
+        if params == None:
+            params = {}
+
+        if isinstance(message, tuple):
+            # (singular, plural[, count parameter])
+            count = params.get(message[2]) if len(message) > 2 else None
+            message = ungettext(message[0], message[1], count if count != None else 2)
+        message = message % params
+
+        order = self.field_order
+        last_field = max(field_list, key = lambda name: order.position(name))
+        if last_field not in self._errors:
+            self._errors[last_field] = self.error_class()
+        self._errors[last_field].append(message)
+
+        # as Django's add_error does, an invalid field has no
+        # cleaned value
+        if last_field in self.cleaned_data:
+            del self.cleaned_data[last_field]
 
 
+# the ordered field names of a form, with everything partial
+# validation needs to know about them precomputed:
+#
+#   names           field names, in order (a tuple)
+#   positions       bare field name -> position
+#   prefixed_names  field names as the browser sees them
+#   unprefixed      prefixed field name -> bare field name
+#
+# Instances are shared between form instances (see
+# EnhancedValidationMixin.field_order) so treat them as
+# read-only.
+#
+class FieldOrder(object):
+
+    def __init__(self, names, prefix = None):
+        self.names = names
+        self.positions = dict((name, i) for i, name in enumerate(names))
+        if prefix != None:
+            self.prefixed_names = tuple('%s-%s' % (prefix, name) for name in names)
+        else:
+            self.prefixed_names = names
+        self.unprefixed = dict(zip(self.prefixed_names, names))
+
+        # the value handed to client-side code so it can
+        # track the "last" field without sorting DOM nodes
+        self.client_order = ' '.join(self.prefixed_names)
+
+        # field sets for partial validation, by position
+        self._names_through = {}
+
+        # the form class's validation rules compiled for this
+        # layout; see EnhancedValidationMixin._get_compiled_rules
+        self.compiled_rules = None
+
+    # position of a field, given either its bare or prefixed
+    # name; None if it's not a field on the form
+    def position(self, name):
+        name = self.unprefixed.get(name, name)
+        return self.positions.get(name)
+
+    # the set of fields up to and including a position
+    def names_through(self, position):
+        names = self._names_through.get(position)
+        if names == None:
+            names = frozenset(self.names[:position+1])
+            self._names_through[position] = names
+        return names
+
 # when working with the require_ordering rule, we have the
 # ability to include literals in the field list, so we need
 # a way to distinguish field names from string literals;
@@ -359,6 +1051,17 @@ class FF(object):
 #
 class AjaxForm(EnhancedValidationMixin, CrispyMixin, forms.Form):
 
+    # set this to True to give the client-side code a compact
+    # description of the simple rules for each field (required,
+    # lengths, numeric type and range, regex) along with the
+    # matching error messages, so that it can check them itself
+    # before deciding whether a partial validation round trip is
+    # needed; see get_client_validation_schema
+    #
+    # NOTE: the server is still authoritative; full submission
+    # always validates everything
+    client_validation = False
+
     def __init__(self, *args, **kwargs):
         # first, go ahead and let the Django Form class set
         # itself up; this loops through the field definitions
@@ -367,102 +1070,266 @@ class AjaxForm(EnhancedValidationMixin, CrispyMixin, forms.Form):
         # instance
         result = super(AjaxForm, self).__init__(*args, **kwargs)
         
-        # now loop through the generated field list and find
+        # now loop through the generated field list and apply
         # substitute error messages for each possibility
         # NOTE: self.fields is a SortedDict, but we can iterate
         # over self like a list to retrieve the fields in order
-        
-        # get the error message overrides for this form
-        form_specific_errors = error_messages.get(self.__class__.__name__)
-        
+        #
+        # NOTE: finding the replacement messages is expensive
+        # (MRO walks, several dict probes per code) and the
+        # answer only depends on the form class, the field name
+        # and the field class, so the resolved messages are kept
+        # per form class; see _get_error_message_plan
         for name, field in self.fields.iteritems():
             # first, make sure the field has a label; this is
             # required for proper functioning of errors in the
             # client-side code
-            if not hasattr(field, 'label') or field.label == "":
-                raise AttributeError(
-                        "Field %(name)s of type %(type)s is missing its label attribute" % {
-                                'name': name,
-                                'type': field.__class__.__name__
-                            }
-                    )
-
-            # NOTE: we use items() instead of iteritems()
-            # here because iteritems() returns an Iterator
-            # which will freak out if we change the entries
-            # in the dictionary while we are iterating;
-            # items() makes duplicate lists and can handle
-            # changing the original dictionary
-            for code, message in field.error_messages.items():
-                new_message = self._find_error_message(field, name, code, form_specific_errors)
-                self._replace_error_message(field.error_messages, code, new_message)
-        
-            # extra wrinkle: some of the fields don't have
-            # their own validation code, they import one or
-            # more validators which themselves may raise
-            # ValidationError; unfortunately Django doesn't
-            # collect validation error messages from these,
-            # so we look for a validators attribute and
-            # process it ourselves
-            if hasattr(field, 'validators'):
-                for validator in field.validators:
-                    if not hasattr(validator, 'code'):
-                        # because there's one that doesn't, damn you Django
-                        code = 'invalid'
-                    else:
-                        code = validator.code
-                    new_message = self._find_error_message(field, name, code, form_specific_errors)
-                    self._replace_error_message(field.error_messages, code, new_message)
-        
+            self._check_field_label(field, name)
+
+            # NOTE: each field instance has its own copy of the
+            # error_messages dict (Django copies it when the
+            # form deep-copies base_fields), so updating it in
+            # place does not affect other instances
+            field.error_messages.update(self._get_error_message_plan(field, name))
+
+        # tell the client-side code the field order, so that
+        # partial validation can track the last field entered
+        # NOTE: assign a new dict; the helper's attrs may be
+        # shared with other instances
+        self.helper.attrs = dict(self.helper.attrs or {})
+        self.helper.attrs['data-sculpt-field-order'] = self.field_order.client_order
+
+        # and where to find the message catalog, if errors
+        # are to be sent in compact form
+        catalog_url = get_error_catalog_url()
+        if catalog_url != None:
+            self.helper.attrs['data-sculpt-error-catalog'] = catalog_url
+
+        # only unbound forms get rendered, so only they need
+        # the client-side validation rules
+        if self.client_validation and not self.is_bound:
+            self.helper.attrs['data-sculpt-validation'] = json.dumps(self.get_client_validation_schema(), cls = DjangoJSONEncoder, separators = (',', ':'))
+
         # return the original result
         return result
 
+    # build the client-side validation schema: a dict, keyed by
+    # prefixed field name, of dicts with these keys:
+    #
+    #   label           the field label
+    #   required        whether a value is required
+    #   strip           whether leading/trailing whitespace is
+    #                   ignored (optional)
+    #   type            'integer' or 'number' (optional)
+    #   min_length, max_length, min_value, max_value
+    #                   limits, from the field's validators
+    #                   (optional); the client counts lengths
+    #                   in code points, as we do
+    #   regex           a pattern the value must match (optional)
+    #   messages        the error message for each code the
+    #                   client may report; plural messages are
+    #                   given as [singular, plural, param_name]
+    #   complete        True if these rules are ALL the checks
+    #                   the field gets, so a value that passes
+    #                   them needs no server round trip
+    #
+    # NOTE: messages are exactly the ones the server would use
+    # (see _find_error_message), including __fieldname__
+    #
+    def get_client_validation_schema(self):
+        # a form-wide clean() or rules may look at any field, so
+        # no field can be considered completely checked
+        form_is_simple = (
+                self.__class__.clean.im_func is forms.BaseForm.clean.im_func
+                and not getattr(self, 'validation_rules', None)
+            )
+
+        schema = {}
+        for name, field in self.fields.iteritems():
+            schema[self.add_prefix(name)] = self._get_client_field_schema(field, name, form_is_simple)
+        return schema
+
+    # the schema for a single field; see above
+    def _get_client_field_schema(self, field, name, form_is_simple):
+        field_schema = {
+                'label': field.label,
+                'required': field.required,
+            }
+        if getattr(field, 'strip', False):
+            field_schema['strip'] = True
+
+        codes = []
+        if field.required:
+            codes.append('required')
+
+        # only field types we can check exactly are complete,
+        # and only if nothing on the form adds to them
+        complete = (
+                form_is_simple
+                and field.__class__ in (forms.CharField, forms.IntegerField, forms.FloatField)
+                and not hasattr(self, 'clean_%s' % name)
+            )
+
+        if isinstance(field, forms.IntegerField):
+            field_schema['type'] = 'integer'
+            codes.append('invalid')
+        elif isinstance(field, (forms.FloatField, forms.DecimalField)):
+            # NOTE: DecimalField digit limits aren't checked
+            # client-side, but the type is
+            field_schema['type'] = 'number'
+            codes.append('invalid')
+
+        for validator in field.validators:
+            if isinstance(validator, MaxLengthValidator):
+                field_schema['max_length'] = validator.limit_value
+                codes.append(validator.code)
+            elif isinstance(validator, MinLengthValidator):
+                field_schema['min_length'] = validator.limit_value
+                codes.append(validator.code)
+            elif isinstance(validator, MaxValueValidator):
+                field_schema['max_value'] = validator.limit_value
+                codes.append(validator.code)
+            elif isinstance(validator, MinValueValidator):
+                field_schema['min_value'] = validator.limit_value
+                codes.append(validator.code)
+            elif isinstance(validator, RegexValidator) and self._is_client_regex(validator):
+                field_schema['regex'] = validator.regex.pattern
+                codes.append(validator.code)
+            else:
+                # something we can't check in the browser
+                complete = False
+
+        field_schema['messages'] = dict((code, self._find_error_message(field, name, code)) for code in codes)
+        field_schema['complete'] = complete
+        return field_schema
+
+    # whether a RegexValidator means the same thing to a
+    # JavaScript RegExp; we're conservative and only pass on
+    # plain patterns without Python-only syntax
+    @staticmethod
+    def _is_client_regex(validator):
+        if getattr(validator, 'inverse_match', False) or getattr(validator, 'flags', 0):
+            return False
+        pattern = validator.regex.pattern
+        for python_only in [ '(?', '\\A', '\\Z' ]:
+            if python_only in pattern:
+                return False
+        return True
+
+    # do the per-class work that would otherwise be done by the
+    # first instance of this form: check labels and resolve the
+    # error message plans for every declared field
+    #
+    # This is intended to be called at deployment time (see
+    # sculpt.ajax.warmup) so that missing labels and unknown
+    # error codes are reported before any request arrives, and
+    # so that the resolved messages are built before worker
+    # processes fork. Fields added dynamically in __init__ are
+    # not seen here and are resolved on first use as usual.
+    #
+    @classmethod
+    def prepare_class(cls):
+        for name, field in cls.base_fields.iteritems():
+            cls._check_field_label(field, name)
+            cls._get_error_message_plan(field, name)
+
+    # make sure a field has a label, raising AttributeError if not
+    @staticmethod
+    def _check_field_label(field, name):
+        if not hasattr(field, 'label') or field.label == "":
+            raise AttributeError(
+                    "Field %(name)s of type %(type)s is missing its label attribute" % {
+                            'name': name,
+                            'type': field.__class__.__name__
+                        }
+                )
+
+    # find (or build) the complete set of replacement error
+    # messages for a field on this form class; the result is a
+    # dict of code -> message suitable for applying directly to
+    # field.error_messages
+    #
+    # Plans are cached on the form class itself (not inherited
+    # by sub-classes, since form-specific messages are looked
+    # up by class name) and keyed by field name and field class.
+    # If a field instance turns out to have codes the cached
+    # plan doesn't cover (e.g. a field altered in
+    # setup_form_helper) the plan is rebuilt to include them.
+    #
+    # NOTE: plans may be built concurrently by two threads on
+    # first use; both will produce the same result, so the
+    # race is harmless
+    #
+    @classmethod
+    def _get_error_message_plan(cls, field, field_name):
+        plans = cls.__dict__.get('_error_message_plans')
+        if plans is None:
+            plans = {}
+            cls._error_message_plans = plans
+
+        key = (field_name, field.__class__)
+        plan = plans.get(key)
+        if plan is None or not cls._is_error_message_plan_complete(plan, field):
+            plan = cls._build_error_message_plan(field, field_name)
+            plans[key] = plan
+
+        return plan
+
+    # check whether a plan covers every code a field might
+    # raise, both its own error_messages and the codes of its
+    # validators
+    @staticmethod
+    def _is_error_message_plan_complete(plan, field):
+        if not plan.viewkeys() >= field.error_messages.viewkeys():
+            return False
+        for validator in getattr(field, 'validators', []):
+            if getattr(validator, 'code', 'invalid') not in plan:
+                return False
+        return True
+
+    # resolve every replacement message for a field
+    @classmethod
+    def _build_error_message_plan(cls, field, field_name):
+        plan = {}
+        for code in field.error_messages:
+            new_message = cls._find_error_message(field, field_name, code)
+            cls._replace_error_message(plan, code, new_message)
+
+        # extra wrinkle: some of the fields don't have
+        # their own validation code, they import one or
+        # more validators which themselves may raise
+        # ValidationError; unfortunately Django doesn't
+        # collect validation error messages from these,
+        # so we look for a validators attribute and
+        # process it ourselves
+        for validator in getattr(field, 'validators', []):
+            # because there's one that doesn't have a code, damn you Django
+            code = getattr(validator, 'code', 'invalid')
+            if code not in plan:
+                new_message = cls._find_error_message(field, field_name, code)
+                cls._replace_error_message(plan, code, new_message)
+
+        return plan
+
     # given a field, name and error code, find the appropriate
     # error message
-    # NOTE: if form_specific_errors is None, it will be looked up
+    # NOTE: form_specific_errors is no longer used (the catalog
+    # indexes form-specific messages itself) but is still
+    # accepted for compatibility with existing callers
     # NOTE: when looking up __all__ messages, use None for field
     # NOTE: raises KeyError for undefined error messages
     @classmethod
     def _find_error_message(cls, field, field_name, code, form_specific_errors = None):
-        if form_specific_errors == None:
-            form_specific_errors = error_messages.get(cls.__name__)     # might still be None
-            
-        # for each error message, check first for a 
-        # form-specific error message; if that fails,
-        # walk back through the class hierarchy to see
-        # if we have a replacement message, and stop at
-        # the first replacement; if there are none,
-        # check the _global set last
-
-        if form_specific_errors:
-            # we have form-specific errors to look through
-
-            # form-specific field-specific
-            error_id = field_name + '__' + code
-            if error_id in form_specific_errors:
-                return form_specific_errors[error_id]
-
-            # form-specific form-wide
-            error_id = code
-            if error_id in form_specific_errors:
-                return form_specific_errors[error_id]
-
-        # no form-specific error; walk the MRO list
-        # (use None as a placeholder for the classless message)
-        class_name_list = [ cls.__name__ for cls in field.__class__.__mro__ ] + [ None ]
-        for field_class in class_name_list:
-
-            # what to look for for this entry
-            # (usually with a class prefix)
-            if field_class != None:
-                error_id = field_class + '__' + code
-            else:
-                error_id = code
-
-            # if we have a replacement, apply it and stop
-            # searching
-            if error_id in error_messages['_global']:
-                return error_messages['_global'][error_id]
+        # for each error message, the catalog checks first for
+        # a form-specific error message; if that fails, it walks
+        # back through the class hierarchy to see if we have a
+        # replacement message, and stops at the first
+        # replacement; if there are none, it checks the _global
+        # set last
+        field_class = field.__class__ if field is not None else None
+        message = error_message_catalog.find(cls.__name__, field_name, field_class, code)
+        if message is not None:
+            return message
 
         # hmmm, we found an error code we can't identify;
         # treat this as an exception so that the message
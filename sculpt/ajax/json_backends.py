@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.encoding import force_text
+from django.utils.functional import Promise
+
+#
+# JSON serializer backends
+#
+# Every sculpt-ajax response is JSON, so the serializer is on the
+# path of every AJAX request. The stdlib json module is the
+# slowest of the common choices; set SCULPT_AJAX_JSON_BACKEND to
+# use a faster one when it's installed:
+#
+#   'json'          the stdlib (the default)
+#   'simplejson'    simplejson (fast with its C speedups)
+#   'auto'          the fastest of the above that's installed
+#
+# A list of names may also be given; the first one installed is
+# used. If none of them is installed, we fall back to the stdlib.
+#
+# All backends produce compact output and handle the same types
+# as Django's JsonResponse (dates and times, decimals, UUIDs) as
+# well as lazy translation strings, so they can be swapped freely.
+#
+# NOTE: only Python 2 libraries are listed. orjson and the ujson
+# releases that accept a default function (5.4 and later) are
+# Python 3 only, and older ujson can't serialize Django's types.
+#
+
+# the order 'auto' tries them in
+AUTO_BACKENDS = [ 'simplejson', 'json' ]
+
+# convert the types the JSON libraries don't know about
+_django_encoder = DjangoJSONEncoder()
+
+def _default(o):
+    if isinstance(o, Promise):
+        # lazy translation string
+        return force_text(o)
+    return _django_encoder.default(o)
+
+# stdlib JSON encoder with compact separators
+class _CompactEncoder(DjangoJSONEncoder):
+
+    def default(self, o):
+        if isinstance(o, Promise):
+            return force_text(o)
+        return super(_CompactEncoder, self).default(o)
+
+# each backend loader returns a dumps(data) function that
+# produces a byte string, or raises ImportError if the backend
+# isn't usable
+
+def _load_json():
+    encoder = _CompactEncoder(separators = (',', ':'))
+    def dumps(data):
+        return encoder.encode(data).encode('utf-8')
+    return dumps
+
+# NOTE: simplejson's own handling of decimals and namedtuples
+# (as numbers and objects) is turned off, so they come out as the
+# stdlib would write them (as strings and arrays)
+def _load_simplejson():
+    import simplejson
+    def dumps(data):
+        return simplejson.dumps(data, separators = (',', ':'), default = _default, use_decimal = False, namedtuple_as_object = False).encode('utf-8')
+    return dumps
+
+BACKEND_LOADERS = {
+        'json': _load_json,
+        'simplejson': _load_simplejson,
+    }
+
+# load a backend by name; raises ImportError if it's not
+# installed, KeyError if it's not a backend we know about
+def load_backend(name):
+    return BACKEND_LOADERS[name]()
+
+# the names of the installed backends
+def get_available_backends():
+    available = []
+    for name in AUTO_BACKENDS:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+# the configured backend, once loaded: (name, dumps)
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend == None:
+        names = getattr(settings, 'SCULPT_AJAX_JSON_BACKEND', 'json')
+        if names == 'auto':
+            names = AUTO_BACKENDS
+        elif isinstance(names, basestring):
+            names = [ names ]
+
+        for name in list(names) + [ 'json' ]:
+            try:
+                _backend = (name, load_backend(name))
+                break
+            except ImportError:
+                continue
+
+    return _backend
+
+# serialize data to a UTF-8 byte string with the configured backend
+def dumps(data):
+    return get_backend()[1](data)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sculpt.ajax.benchmarks import BENCHMARKS
+
+# run the sculpt-ajax micro-benchmarks and print the results
+#
+class Command(BaseCommand):
+    help = 'Runs sculpt-ajax micro-benchmarks. Available: %s' % ', '.join(sorted(BENCHMARKS.keys()))
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs = '*', help = 'benchmarks to run (default: all)')
+        parser.add_argument('--iterations', type = int, default = 10000, help = 'iterations per measurement')
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(BENCHMARKS.keys())
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError('unknown benchmark %s' % name)
+
+        for name in names:
+            self.stdout.write('%s:' % name)
+            for label, value, unit in BENCHMARKS[name](iterations = options['iterations']):
+                self.stdout.write('    %-40s %12.1f %s' % (label, value, unit))
@@ -0,0 +1,18 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from sculpt.ajax.warmup import warmup
+
+# run the sculpt-ajax warmup as a deployment check; exits with an
+# error listing every problem found
+#
+class Command(BaseCommand):
+    help = 'Prepares all AJAX forms and compiles AJAX view templates, reporting any problems.'
+
+    def handle(self, *args, **options):
+        try:
+            counts = warmup()
+        except ImproperlyConfigured, e:
+            raise CommandError(str(e))
+
+        self.stdout.write('Prepared %(forms)d forms and %(templates)d templates for %(views)d views.' % counts)
@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from HTMLParser import HTMLParser, HTMLParseError
+
+import difflib
+import hashlib
+
+#
+# HTML update patches
+#
+# An HTML update in 'patch' mode replaces the target's content
+# like the default mode, but when we know what the client is
+# currently showing we send only the differences. Updating one
+# row of a large table then costs one row, not the table, and
+# the client keeps everything else in place (scroll position,
+# widgets, focus).
+#
+# If the client's element doesn't have the nodes the patch
+# expects (something else changed it), the client can't apply
+# the patch. It forgets the element's hash, so the server sends
+# the full HTML the next time the element is updated, and
+# triggers a sculpt-patch-failed event on the element, so the
+# page can ask for an update straight away if it can't wait.
+#
+# The diff is structural but deliberately shallow: a fragment is
+# split into its top-level nodes (elements, runs of text,
+# comments), which correspond one-to-one with the target
+# element's child nodes in the browser, and those are diffed as
+# units. The patch is a list of operations applied to the child
+# nodes in order:
+#
+#   [ 'k', n ]          keep the next n nodes
+#   [ 'd', n ]          delete the next n nodes
+#   [ 'i', html ]       insert html at this point
+#
+# To diff, we need the HTML the client has. The last fragment
+# sent for each target is kept in a Django cache, per session,
+# and it's only used if it matches the hash the client sent
+# for that target (see sculpt.ajax.responses.build_update), so a
+# second tab or a lost response can't leave the client patching
+# the wrong HTML. Whenever we can't patch (no session, no cached
+# fragment, HTML we can't split reliably, or a patch that isn't
+# smaller than the HTML) the update is sent in full.
+#
+# Configure the cache with SCULPT_AJAX_PATCH_CACHE, a dict with
+# these optional keys:
+#
+#   cache       the Django cache alias (default 'default')
+#   timeout     seconds to keep each fragment (default 600)
+#
+# NOTE: for a reliable patch, the fragment must be HTML the
+# browser parses exactly as written into the target. In
+# particular, close every element (no implied </li> or </p>),
+# and patch a <tbody> rather than its <table>, since the browser
+# inserts a <tbody> of its own.
+#
+
+# elements that never have content or an end tag
+VOID_ELEMENTS = frozenset([
+        'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+        'keygen', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+    ])
+
+# splits a fragment into its top-level nodes
+class _FragmentSplitter(HTMLParser):
+
+    def __init__(self, html):
+        HTMLParser.__init__(self)
+        self.html = html
+        # HTMLParser counts lines by \n alone
+        self.line_offsets = [ 0 ]
+        for line in html.split('\n'):
+            self.line_offsets.append(self.line_offsets[-1] + len(line) + 1)
+
+        self.open_elements = []
+        self.starts = []            # offset of each top-level node
+        self.last_was_text = False
+        self.malformed = False
+
+    # the offset of the construct being handled
+    def source_offset(self):
+        lineno, column = self.getpos()
+        return self.line_offsets[lineno - 1] + column
+
+    # a top-level node starts here, unless it's more text
+    # following text (which the browser joins into one node)
+    def node(self, is_text = False):
+        if not self.open_elements and not (is_text and self.last_was_text):
+            self.starts.append(self.source_offset())
+        if not self.open_elements:
+            self.last_was_text = is_text
+
+    def handle_starttag(self, tag, attrs):
+        self.node()
+        if tag not in VOID_ELEMENTS:
+            self.open_elements.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.node()
+
+    def handle_endtag(self, tag):
+        if not self.open_elements or self.open_elements[-1] != tag:
+            # an implied end tag or a stray one; we can't tell
+            # how the browser will arrange things
+            self.malformed = True
+            return
+        self.open_elements.pop()
+
+    def handle_data(self, data):
+        self.node(is_text = True)
+
+    def handle_entityref(self, name):
+        self.node(is_text = True)
+
+    def handle_charref(self, name):
+        self.node(is_text = True)
+
+    def handle_comment(self, data):
+        self.node()
+
+    def handle_decl(self, decl):
+        self.malformed = True
+
+    def handle_pi(self, data):
+        self.malformed = True
+
+# split a fragment into the source of each of its top-level
+# nodes, or return None if it can't be done reliably
+def split_fragment(html):
+    splitter = _FragmentSplitter(html)
+    try:
+        splitter.feed(html)
+        splitter.close()
+    except HTMLParseError:
+        return None
+    if splitter.malformed or splitter.open_elements:
+        return None
+
+    bounds = splitter.starts + [ len(html) ]
+    return [ html[bounds[i]:bounds[i + 1]] for i in range(len(splitter.starts)) ]
+
+# work out the patch from one fragment to another; returns
+# (operations, number of nodes in the old fragment), or None if
+# either fragment can't be split
+def diff_fragments(old_html, new_html):
+    old_nodes = split_fragment(old_html)
+    new_nodes = split_fragment(new_html)
+    if old_nodes == None or new_nodes == None:
+        return None
+
+    operations = []
+    matcher = difflib.SequenceMatcher(None, old_nodes, new_nodes, autojunk = False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([ 'k', i2 - i1 ])
+            continue
+        if i2 > i1:
+            operations.append([ 'd', i2 - i1 ])
+        if j2 > j1:
+            operations.append([ 'i', ''.join(new_nodes[j1:j2]) ])
+
+    # trailing keeps are implied
+    if operations and operations[-1][0] == 'k':
+        operations.pop()
+
+    return operations, len(old_nodes)
+
+#
+# the per-session record of what each client was last sent
+#
+
+def _get_cache_options():
+    options = getattr(settings, 'SCULPT_AJAX_PATCH_CACHE', {})
+    return caches[options.get('cache', 'default')], options.get('timeout', 600)
+
+def _get_cache_key(request, html_id):
+    session_key = request.session.session_key
+    digest = hashlib.md5(('%s:%s' % (session_key, html_id)).encode('utf-8')).hexdigest()
+    return 'sculpt.ajax.patch:' + digest
+
+# the fragment last sent to this session for html_id, or None
+def get_previous_fragment(request, html_id):
+    if request == None or getattr(request, 'session', None) == None or not request.session.session_key:
+        return None
+    cache, timeout = _get_cache_options()
+    return cache.get(_get_cache_key(request, html_id))
+
+# remember the fragment sent to this session for html_id
+def set_previous_fragment(request, html_id, html):
+    if request == None or getattr(request, 'session', None) == None or not request.session.session_key:
+        return
+    cache, timeout = _get_cache_options()
+    cache.set(_get_cache_key(request, html_id), html, timeout)
@@ -1,10 +1,354 @@
 from django.conf import settings
-from django.http import JsonResponse
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template import Variable, VariableDoesNotExist
 from django.template.loader import get_template, render_to_string
-from django.utils.encoding import force_text
+from django.utils.encoding import force_text, smart_bytes
+from sculpt.ajax import concurrency, json_backends, patching
+from sculpt.ajax.caching import LRUCache
+from sculpt.ajax.forms import error_message_catalog
+from sculpt.ajax.stats import emit
+from sculpt.ajax.timing import get_timer
 from sculpt.json_tools import to_json
 import copy
+import hashlib
 import json
+import os
+
+#
+# compiled-template cache
+#
+# Mixed responses render several templates per request (modal
+# body and title, toast, every HTML update). get_template() has
+# to find and compile each of them every time unless the cached
+# template loader is configured, so we keep our own bounded LRU
+# cache of compiled template objects, keyed by template name.
+#
+# Configure it with SCULPT_AJAX_TEMPLATE_CACHE, a dict with these
+# optional keys:
+#
+#   max_entries     most templates kept (default 500)
+#   autoreload      check the template file's modification time
+#                   on every use and recompile if it has changed
+#                   (default: the value of DEBUG)
+#
+# or set it to True to use the defaults, or False to disable the
+# cache altogether. Hit, miss
+# and eviction counts are available from get_template_cache_stats().
+#
+# NOTE: autoreload only works for templates loaded from files;
+# templates from other loaders are cached until evicted.
+#
+_template_cache = None
+_template_cache_autoreload = False
+
+def get_template_cache():
+    global _template_cache, _template_cache_autoreload
+    if _template_cache == None:
+        options = getattr(settings, 'SCULPT_AJAX_TEMPLATE_CACHE', {})
+        if options is False:
+            return None
+        if options is True:
+            options = {}
+        _template_cache_autoreload = options.get('autoreload', settings.DEBUG)
+        _template_cache = LRUCache(options.get('max_entries', 500))
+    return _template_cache
+
+# the modification time of the file a template came from, or
+# None if we can't tell
+def _get_template_mtime(template):
+    # Django's backend wrapper keeps the original template
+    template = getattr(template, 'template', template)
+    origin = getattr(template, 'origin', None)
+    file_name = getattr(origin, 'name', None)
+    if not file_name or not os.path.isfile(file_name):
+        return None
+    return os.path.getmtime(file_name)
+
+# a drop-in replacement for get_template() that uses the cache
+def get_cached_template(template_name):
+    cache = get_template_cache()
+    if cache == None:
+        return get_template(template_name)
+
+    entry = cache.get(template_name)
+    if entry != None:
+        template, mtime = entry
+        if not _template_cache_autoreload or mtime == None or _get_template_mtime(template) == mtime:
+            return template
+
+    template = get_template(template_name)
+    cache.set(template_name, (template, _get_template_mtime(template) if _template_cache_autoreload else None))
+    return template
+
+# hit/miss/eviction counters for the template cache
+def get_template_cache_stats():
+    cache = get_template_cache()
+    if cache == None:
+        return None
+    return cache.stats()
+
+#
+# fragment caching
+#
+# Many fragments render the same for every user (a sidebar list)
+# or for every user and object (a cart badge). Any modal, toast
+# or update entry can declare a cache:
+#
+#   'cache': {
+#           'vary_on': [ 'request.user.pk', 'product.pk' ],
+#           'timeout': 300,
+#           'backend': 'default',
+#       }
+#
+# The keys are:
+#
+#   vary_on     a list of context variables (dotted, as in a
+#               template) whose values are part of the cache key;
+#               if any of them doesn't exist in the context, the
+#               fragment is not cached
+#   key         or instead, a callable that is given the context
+#               and returns the variable part of the key; if it
+#               returns None, the fragment is not cached
+#   timeout     seconds to keep the HTML (default: the backend's
+#               default timeout)
+#   backend     the Django cache alias (default 'default')
+#
+# The template name is always part of the key; with neither
+# vary_on nor key, the fragment is the same for everyone. Hits
+# and misses are reported as fragment_cache_hit and
+# fragment_cache_miss events (see sculpt.ajax.stats).
+#
+# NOTE: a modal's title template is cached along with its body,
+# under the same key.
+#
+
+# a compiled cache declaration
+class FragmentCacheSpec(object):
+    # marker for "use the backend's default timeout"
+    DEFAULT_TIMEOUT = object()
+
+    def __init__(self, spec):
+        self.key_function = spec.get('key')
+        self.vary_on = tuple([ Variable(name) for name in spec.get('vary_on', []) ])
+        self.timeout = spec.get('timeout', self.DEFAULT_TIMEOUT)
+        self.backend = spec.get('backend', 'default')
+        if self.key_function != None and self.vary_on:
+            raise Exception('AJAX fragment cache may use key or vary_on, not both')
+
+    # the cache key for a template rendered with this context,
+    # or None if it shouldn't be cached
+    def get_key(self, template_name, context):
+        if self.key_function != None:
+            variable_key = self.key_function(context)
+            if variable_key == None:
+                return None
+        else:
+            values = []
+            for variable in self.vary_on:
+                try:
+                    values.append(variable.resolve(context))
+                except VariableDoesNotExist:
+                    # without it, different users' fragments
+                    # could share a key; don't cache at all
+                    return None
+            variable_key = repr(values)
+        # hashed, so the key is safe for any backend
+        digest = hashlib.md5(smart_bytes(template_name) + b'\0' + smart_bytes(variable_key)).hexdigest()
+        return 'sculpt.ajax.fragment:' + digest
+
+# render a template, using the fragment cache if the entry has
+# a cache declaration; extra_template_names are rendered along
+# with it (under the same key) and all the results returned
+# as a list
+def render_fragment(context, cache_spec, template_name, *extra_template_names):
+    template_names = (template_name,) + extra_template_names
+    key = None
+    if cache_spec != None:
+        key = cache_spec.get_key(template_name, context)
+    if key == None:
+        return [ get_cached_template(name).render(context) for name in template_names ]
+
+    cache = caches[cache_spec.backend]
+    html = cache.get(key)
+    if html != None:
+        emit('fragment_cache_hit', template_name = template_name, key = key, backend = cache_spec.backend)
+        return html
+
+    emit('fragment_cache_miss', template_name = template_name, key = key, backend = cache_spec.backend)
+    html = [ get_cached_template(name).render(context) for name in template_names ]
+    if cache_spec.timeout is FragmentCacheSpec.DEFAULT_TIMEOUT:
+        cache.set(key, html)
+    else:
+        cache.set(key, html, cache_spec.timeout)
+    return html
+
+#
+# fragment hashes
+#
+# Views that are polled, or that update the same targets over
+# and over, often send HTML that the page is already showing.
+# Each HTML update that replaces its target's content (the
+# default and 'replace' modes) carries a short hash of its HTML;
+# the client remembers it on the element and, on later requests,
+# sends the hashes it has in an X-Sculpt-Fragments header:
+#
+#   X-Sculpt-Fragments: cart_badge:1f3a... sidebar:9bc0...
+#
+# If a freshly rendered fragment has the same hash as the one
+# the client is showing, the update is sent as
+#
+#   {"id": "cart_badge", "not_modified": true}
+#
+# (plus any class changes) instead, and the client leaves the
+# element alone. This only happens when the request is passed
+# to AjaxMixedResponse.create (as AjaxResponseView does). The
+# same hashes let 'patch' mode updates send only what changed
+# (see sculpt.ajax.patching).
+#
+
+# the update modes whose result is exactly the rendered HTML
+HASHED_UPDATE_MODES = [ None, 'replace' ]
+
+# the client's fragment hashes, as a dict of id -> hash
+def get_client_fragment_hashes(request):
+    if request == None:
+        return None
+    hashes = {}
+    for item in request.META.get('HTTP_X_SCULPT_FRAGMENTS', '').split():
+        html_id, _, fragment_hash = item.rpartition(':')
+        if html_id:
+            hashes[html_id] = fragment_hash
+    return hashes
+
+def hash_fragment(html):
+    return hashlib.md5(smart_bytes(html)).hexdigest()[:16]
+
+# build an update to send to the client from its compiled
+# values and rendered HTML; client_hashes is None if the client
+# isn't taking part in hash negotiation
+#
+# 'patch' mode updates are sent as patches when the request is
+# given and we know what the client is showing (see
+# sculpt.ajax.patching); otherwise they're sent in full, as
+# default-mode updates
+#
+def build_update(items, html, client_hashes = None, request = None):
+    update = dict(items)
+    is_patch = update.get('mode') == 'patch'
+    if is_patch:
+        del update['mode']
+    if client_hashes == None or update.get('mode') not in HASHED_UPDATE_MODES:
+        update['html'] = html
+        return update
+
+    update['hash'] = hash_fragment(html)
+    client_hash = client_hashes.get(update['id'])
+    if client_hash == update['hash']:
+        # the client already has this; class changes still apply
+        update['not_modified'] = True
+        for k in [ 'mode', 'hash' ]:
+            update.pop(k, None)
+        return update
+
+    update['html'] = html
+    if is_patch:
+        previous_html = patching.get_previous_fragment(request, update['id'])
+        patching.set_previous_fragment(request, update['id'], html)
+        if previous_html != None and client_hash == hash_fragment(previous_html):
+            diff = patching.diff_fragments(previous_html, html)
+            if diff != None and len(json_backends.dumps(diff[0])) < len(smart_bytes(html)):
+                del update['html']
+                update['mode'] = 'patch'
+                update['patch'], update['count'] = diff
+    return update
+
+#
+# response plans
+#
+# A mixed response's modal, toast and updates configuration
+# usually comes from urls.py and is shared by every request to
+# the view, so it must never be modified while rendering. Rather
+# than copying it on every request, we compile it once into a
+# ResponsePlan: the same information, held in tuples, with the
+# template names split out from the values that are sent to the
+# client. Rendering a plan only builds the new response dicts.
+#
+# AjaxResponseView compiles its plan in as_view(); you can also
+# pass a plan to AjaxMixedResponse.create() in place of the
+# response_data dict.
+#
+# NOTE: configuration mistakes (a missing template_name, say)
+# are still reported when a request is made, not when the plan
+# is compiled in as_view(); see AjaxResponseView.as_view
+#
+class ResponsePlan(object):
+
+    def __init__(self, modal = None, toast = None, updates = None):
+        # the configuration the plan was compiled from, kept so
+        # a view can tell if it has since been replaced
+        self.sources = (modal, toast, updates)
+
+        # (template_name, has_title, title, title_template_name,
+        # cache_spec); a title given as None is still a title
+        self.modal = None
+        if modal:
+            self.modal = (modal['template_name'], 'title' in modal, modal.get('title'), modal.get('title_template_name'), self.compile_cache_spec(modal))
+
+        # (template_name, duration, class_name, cache_spec)
+        self.toast = None
+        if toast:
+            self.toast = (toast['template_name'], toast.get('duration', settings.SCULPT_DEFAULT_TOAST_DURATION), toast.get('class_name'), self.compile_cache_spec(toast))
+
+        # ((template_name, ((key, value), ...), cache_spec), ...)
+        self.updates = None
+        if updates:
+            self.updates = self.compile_updates(updates)
+
+    # compile a list of update dicts
+    @classmethod
+    def compile_updates(cls, updates):
+        compiled = []
+        for update in updates:
+            items = tuple([ (k, v) for k, v in update.iteritems() if k not in [ 'template_name', 'cache' ] ])
+            compiled.append((update['template_name'], items, cls.compile_cache_spec(update)))
+        return tuple(compiled)
+
+    # compile an entry's cache declaration, if it has one
+    @staticmethod
+    def compile_cache_spec(entry):
+        if not entry.get('cache'):
+            return None
+        return FragmentCacheSpec(entry['cache'])
+
+    # build a plan from a response_data dict (see
+    # AjaxMixedResponse.create)
+    @classmethod
+    def from_response_data(cls, response_data):
+        return cls(response_data.get('modal'), response_data.get('toast'), response_data.get('updates'))
+
+    # whether this plan was compiled from exactly these
+    # configuration objects
+    def matches(self, modal, toast, updates):
+        return self.sources[0] is modal and self.sources[1] is toast and self.sources[2] is updates
+
+#
+# the base of all sculpt-ajax responses
+#
+# This is still a JsonResponse (views check for that to decide
+# whether a hook returned a response) but it serializes with the
+# configured JSON backend rather than the stdlib; see
+# sculpt.ajax.json_backends.
+#
+class AjaxJsonResponse(JsonResponse):
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        # skip JsonResponse's own serialization
+        with get_timer().phase('json'):
+            content = json_backends.dumps(data)
+        super(JsonResponse, self).__init__(content = content, **kwargs)
 
 #
 # success-ish responses
@@ -19,7 +363,7 @@ import json
 # NOTE: validation here is cursory and mainly is intended to
 # catch programming or configuration mistakes
 #
-class AjaxMixedResponse(JsonResponse):
+class AjaxMixedResponse(AjaxJsonResponse):
 
     def __init__(self, **kwargs):
         # make sure we have at least one required key
@@ -59,7 +403,7 @@ class AjaxMixedResponse(JsonResponse):
         if 'html' in kwargs:
             html_list = kwargs['html']
             for html in html_list:
-                if 'id' not in html or 'html' not in html:
+                if 'id' not in html or ('html' not in html and not html.get('not_modified') and 'patch' not in html):
                     raise Exception('AJAX HTML update response requested but an update is missing required id or html values')
                     
             kwargs['html'] = to_json(html_list)
@@ -95,7 +439,7 @@ class AjaxMixedResponse(JsonResponse):
     #       template_name a modal response
     #       title_template_name   modal's title template (optional)
     #       title           bare string for modal title (not template) (optional)
-    #   toast               a dict or list of dicts:
+    #   toast               a dict:
     #       template_name   a toast response
     #       duration        how long to leave the toast up
     #   updates             a list:
@@ -104,6 +448,17 @@ class AjaxMixedResponse(JsonResponse):
     #       class_add       class(es) to add to the html_id object
     #       class_remove    class(es) to remove from the html_id object
     #
+    # each of the modal, toast and update entries may also
+    # have a cache declaration (see render_fragment)
+    #
+    # or a ResponsePlan compiled from the same data, which
+    # saves compiling it again on each request
+    #
+    # if the request is given, HTML updates take part in
+    # fragment hash negotiation (see build_update); set
+    # concurrent to render the updates concurrently (see
+    # sculpt.ajax.concurrency)
+    #
     # if a modal is returned, its code will be null
     #
     # As a convenience, you can disable the modal or
@@ -112,43 +467,47 @@ class AjaxMixedResponse(JsonResponse):
     # circumstances; this is especially important since
     # Django creates a view object for each request
     # but the config data would be shared among all
-    # instances, so modifying them on the fly would
-    # require deep-copying them first.
+    # instances, so modifying it on the fly would
+    # require copying it first.
     #
     @classmethod
-    def create(cls, context, response_data, show_modal = True, show_toast = True, show_updates = True):
+    def create(cls, context, response_data, show_modal = True, show_toast = True, show_updates = True, request = None, concurrent = False):
+        if isinstance(response_data, ResponsePlan):
+            plan = response_data
+        else:
+            plan = ResponsePlan.from_response_data(response_data)
         response = {}
 
-        # do a modal
-        if show_modal and 'modal' in response_data:
-            modal_template = get_template(response_data['modal']['template_name'])
-            modaL_html = modal_template.render(context)
-            if 'title' in response_data['modal']:
-                modal_title = response_data['modal']['title']
-            else:
-                modal_title_template = get_template(response_data['modal']['title_template_name'])
-                modal_title = modal_title_template.render(context)
-            response['modal'] = {
-                    'code': None,
-                    'title': modal_title,
-                    'message': modal_html,
-                }
-
-        # do toast
-        if show_toast and 'toast' in response_data:
-            toast_template = get_template(response_data['toast']['template_name'])
-            toast_html = toast_template.render(context)
-            response['toast'] = {
-                    'duration': response_data['toast'].get('duration', settings.SCULPT_DEFAULT_TOAST_DURATION),
-                    'html': toast_html,
-                }
-            if 'class_name' in response_data['toast']:
-                response['toast']['class_name'] = response_data['toast']['class_name']
+        # (this is the render phase if the request is being
+        # timed; see sculpt.ajax.timing)
+        with get_timer().phase('render'):
+            # do a modal
+            if show_modal and plan.modal:
+                template_name, has_title, modal_title, title_template_name, cache_spec = plan.modal
+                if not has_title:
+                    modal_html, modal_title = render_fragment(context, cache_spec, template_name, title_template_name)
+                else:
+                    modal_html, = render_fragment(context, cache_spec, template_name)
+                response['modal'] = {
+                        'code': None,
+                        'title': modal_title,
+                        'message': modal_html,
+                    }
+
+            # do toast
+            if show_toast and plan.toast:
+                template_name, duration, class_name, cache_spec = plan.toast
+                response['toast'] = {
+                        'duration': duration,
+                        'html': render_fragment(context, cache_spec, template_name)[0],
+                    }
+                if class_name != None:
+                    response['toast']['class_name'] = class_name
+
+            # do HTML updates
+            if show_updates and plan.updates:
+                response['html'] = cls.render_html_templates(context, plan.updates, get_client_fragment_hashes(request), request, concurrent)
 
-        # do HTML updates
-        if show_updates and 'updates' in response_data:
-            response['html'] = cls.render_html_templates(context, response_data['updates'])
-            
         # now create the response based on what we have
         return AjaxMixedResponse(**response)
         
@@ -162,19 +521,87 @@ class AjaxMixedResponse(JsonResponse):
     # items suitable for passing to the AjaxHTMLResponse
     # constructor. The dicts are the same format as the
     # returned data, except 'template_name' is given instead
-    # of 'html'.
+    # of 'html'. An update may also declare a fragment cache
+    # (see render_fragment).
+    #
+    # NOTE: updates may also be already compiled (see
+    # ResponsePlan.compile_updates); the update dicts are
+    # never modified either way
+    # NOTE: client_hashes is the client's fragment hashes, if
+    # it sent any, and request is needed for 'patch' mode
+    # updates; see build_update
+    # NOTE: with concurrent set, the templates are rendered
+    # concurrently if that's configured and safe; see
+    # sculpt.ajax.concurrency (in particular, templates that
+    # render concurrently must not evaluate the same queryset)
     #
     @classmethod
-    def render_html_templates(cls, context, updates):
-        rendered_html = copy.deepcopy(updates)
-        for i in range(len(rendered_html)):
-            # render the update                
-            template_name = rendered_html[i].pop('template_name')   # removes it from the dict so it won't go client-side
-            template = get_template(template_name)
-            rendered_html[i]['html'] = template.render(context)
+    def render_html_templates(cls, context, updates, client_hashes = None, request = None, concurrent = False):
+        if updates and isinstance(updates[0], dict):
+            updates = ResponsePlan.compile_updates(updates)
+
+        if concurrent and len(updates) > 1 and concurrency.can_run_concurrently():
+            # each gets its own copy of the context, as rendering
+            # pushes and pops on it
+            html_list = concurrency.run_concurrently([
+                    (render_fragment, (copy.copy(context), cache_spec, template_name))
+                    for template_name, items, cache_spec in updates
+                ])
+            html_list = [ html[0] for html in html_list ]
+        else:
+            html_list = [ render_fragment(context, cache_spec, template_name)[0] for template_name, items, cache_spec in updates ]
+
+        # template_name (and cache) are left out so they won't
+        # go client-side
+        rendered_html = []
+        for (template_name, items, cache_spec), html in zip(updates, html_list):
+            rendered_html.append(build_update(items, html, client_hashes, request))
 
         return rendered_html
 
+# AJAX streaming HTML update response
+#
+# For HTML updates that carry a lot of rendered markup (hundreds
+# of table rows, say), building the whole response in memory
+# costs several times the payload: every fragment, then the dict,
+# then the serialized string. This renders and sends one update
+# at a time instead, producing the same JSON an AjaxHTMLResponse
+# would:
+#
+#   {"sculpt":"ajax","html":[{...},{...}]}
+#
+# The updates are given as for render_html_templates (a list of
+# update dicts, or compiled updates from a ResponsePlan); if the
+# request is given, fragment hashes are negotiated as well.
+#
+# NOTE: templates are rendered as the response is sent, after
+# the view has returned, so an exception in a template can't be
+# turned into an AJAX error response; the client sees a broken
+# response instead. Only stream templates you trust to render.
+#
+class AjaxStreamingHTMLResponse(StreamingHttpResponse):
+
+    def __init__(self, context, updates, request = None, **kwargs):
+        if updates and isinstance(updates[0], dict):
+            updates = ResponsePlan.compile_updates(updates)
+        for template_name, items, cache_spec in updates:
+            if 'id' not in dict(items):
+                raise Exception('AJAX HTML update response requested but an update is missing required id or html values')
+
+        kwargs.setdefault('content_type', 'application/json')
+        super(AjaxStreamingHTMLResponse, self).__init__(self.stream(context, updates, get_client_fragment_hashes(request), request), **kwargs)
+
+    # the response body, a piece at a time
+    @staticmethod
+    def stream(context, updates, client_hashes = None, request = None):
+        yield b'{"sculpt":"ajax","html":['
+        separator = b''
+        for template_name, items, cache_spec in updates:
+            html = render_fragment(context, cache_spec, template_name)[0]
+            yield separator + json_backends.dumps(to_json(build_update(items, html, client_hashes, request)))
+            separator = b','
+        yield b']}'
+
 # AJAX success response
 # for when you need success, but it's a no-op client side
 # NOTE: this might be bad UX, consider toast!
@@ -218,15 +645,25 @@ class AjaxModalResponse(AjaxMixedResponse):
 
 # AJAX redirect response
 #
-class AjaxRedirectResponse(JsonResponse):
+class AjaxRedirectResponse(AjaxJsonResponse):
 
     def __init__(self, response):
         super(AjaxRedirectResponse, self).__init__({ 'sculpt': 'ajax', 'location' : response })
 
+# AJAX superseded response
+# for a request the server knows the client no longer cares
+# about (e.g. a partial validation that has since been followed
+# by another); the client-side code silently drops it
+#
+class AjaxSupersededResponse(AjaxJsonResponse):
+
+    def __init__(self):
+        super(AjaxSupersededResponse, self).__init__({ 'sculpt': 'ajax', 'superseded': True })
+
 # AJAX exception response
 # NOTE: this is NOT an Exception, it's a response
 #
-class AjaxExceptionResponse(JsonResponse):
+class AjaxExceptionResponse(AjaxJsonResponse):
 
     def __init__(self, response = None, **kwargs):
         if not response:
@@ -240,7 +677,7 @@ class AjaxExceptionResponse(JsonResponse):
 # AJAX error response
 # NOTE: this is NOT an Exception, it's a response
 #
-class AjaxErrorResponse(JsonResponse):
+class AjaxErrorResponse(AjaxJsonResponse):
 
     def __init__(self, response = None, **kwargs):
         if not response:
@@ -251,11 +688,26 @@ class AjaxErrorResponse(JsonResponse):
         # (code, title, message)
         super(AjaxErrorResponse, self).__init__({ 'sculpt': 'ajax', 'error' : response })
 
+# whether the client can take compact form errors: they have to
+# be enabled, and the client has to have the current version of
+# the message catalog in the active language (it tells us which
+# it has with the X-Sculpt-Error-Catalog header)
+def accepts_compact_form_errors(request):
+    if not getattr(settings, 'SCULPT_AJAX_COMPACT_FORM_ERRORS', False):
+        return False
+    return request.META.get('HTTP_X_SCULPT_ERROR_CATALOG') == error_message_catalog.get_client_catalog()[0]
+
 # AJAX form error response
 #
-class AjaxFormErrorResponse(JsonResponse):
+# With compact set, each error that uses a catalog message is
+# sent as [catalog key, params] instead of as its text, and the
+# client expands it from its copy of the catalog; any other
+# error (custom messages, multi-field rule errors) is still sent
+# as text. See accepts_compact_form_errors.
+#
+class AjaxFormErrorResponse(AjaxJsonResponse):
 
-    def __init__(self, form, last_field = None, focus_field = None, error = None):
+    def __init__(self, form, last_field = None, focus_field = None, error = None, compact = False):
         # check whether this is a partial validation response
         is_partial = last_field != None
         
@@ -280,9 +732,12 @@ class AjaxFormErrorResponse(JsonResponse):
         error_list = []
         for name, field in form.fields.iteritems():
             if name in form._errors:
-                field_error_list = []
-                for message in form._errors[name]:
-                    field_error_list.append(force_text(message))
+                if compact:
+                    field_error_list = self.get_compact_errors(form, name, field)
+                else:
+                    field_error_list = []
+                    for message in form._errors[name]:
+                        field_error_list.append(force_text(message))
                 # use prefixed name so client side can find it
                 error_list.append([ form.add_prefix(name), field.label, field_error_list ])
 
@@ -311,3 +766,47 @@ class AjaxFormErrorResponse(JsonResponse):
 
         super(AjaxFormErrorResponse, self).__init__(results)
 
+    # a field's errors in compact form
+    @staticmethod
+    def get_compact_errors(form, name, field):
+        errors = form._errors[name]
+        compact_list = []
+        for error in getattr(errors, 'data', errors):
+            # the field's message for this code is the catalog's
+            # (see AjaxForm) unless it was replaced, so if that's
+            # the one used, the client can look it up
+            if isinstance(error, ValidationError) and error.code and error.message is field.error_messages.get(error.code):
+                entry = error_message_catalog.find_entry(form.__class__.__name__, name, field.__class__, error.code)
+                if entry != None and error_message_catalog.is_client_message(entry[1]):
+                    catalog_key, message = entry
+                    compact_list.append([ catalog_key, AjaxFormErrorResponse.get_compact_params(message, error.params) ])
+                    continue
+
+            if isinstance(error, ValidationError):
+                for message in error:
+                    compact_list.append(force_text(message))
+            else:
+                compact_list.append(force_text(error))
+
+        return compact_list
+
+    # the parameters a catalog message uses (validators pass
+    # others, like the value entered, which we don't want to
+    # send back); numbers are kept as numbers for plural
+    # choice and %d, everything else is formatted as %s would
+    @staticmethod
+    def get_compact_params(message, params):
+        compact_params = {}
+        if not params:
+            return compact_params
+        text = ''.join(message) if isinstance(message, tuple) else message
+        for k, v in params.iteritems():
+            is_count = isinstance(message, tuple) and len(message) > 2 and message[2] == k
+            if '%(' + k + ')' not in text and not is_count:
+                continue
+            if isinstance(v, (int, long, float)) and not isinstance(v, bool):
+                compact_params[k] = v
+            else:
+                compact_params[k] = force_text(v)
+        return compact_params
+
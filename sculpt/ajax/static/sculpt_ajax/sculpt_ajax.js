@@ -17,9 +17,18 @@
 		'upload_queue': [],					// any collected uploadable files
 		'upload_queue_id': 1,				// ID of next queue item (so we never duplicate an HTML ID)
 		'chosen_selector': 'select',		// selector to use to turn things into chosen selects
+		'partial_validation_batch_delay': 0,	// milliseconds to collect field blurs into one partial validation request; 0 (the default) sends each immediately
+		'batch_url': null,					// URL of the server's AjaxBatchView; set this to send AJAX calls made close together in one request
+		'batch_delay': 10,					// milliseconds to collect AJAX calls into one batch; 0 collects the calls made in one tick
+		'batch_max': 20,					// most calls in one batch (must not exceed the server's max_requests)
 
 		// internal tracking flags
 		'_skip_partial_validation': null,	// gets set to form name that should be skipped for partial validation because it was submitted
+		'_page_token': '',					// random token identifying this page load; set in init
+		'_error_catalog': null,				// server's error message catalog, for compact form errors; see _load_error_catalog
+		'_error_catalog_loading': false,	// whether we've asked for the catalog yet
+		'_batch_queue': [],					// AJAX calls waiting to be sent in a batch; see _queue_batch
+		'_batch_timer': null,				// timer that sends the batch
 
 		// special classes
 		//
@@ -193,6 +202,13 @@
 			// reason for returning the jqXHR is to allow upload progress monitoring.
 			// This is now irrelevant as we do file upload monitoring internally.
 			//
+			// BATCHING NOTE: if batch_url is set, calls are collected for batch_delay
+			// milliseconds and sent to the server together (see _queue_batch); each
+			// call's handlers are still invoked exactly as above. A batched call
+			// returns an object with only an abort() method rather than a jqXHR.
+			// Pass batch: false in opts to send a call on its own. Calls that can't
+			// be batched (uploads, other sites, anything but a POST) never are.
+			//
 			// Zach Stevenson 7/10/2014  Added a flag to fail silently.  There are situations
 			// like predictive search when you are doing abort() on the ajax object when you
 			// don't want it to pop up a modal saying "You canceled the operation".
@@ -230,6 +246,50 @@
 				new_opts.headers['X-CSRFToken'] = this.cookies.csrftoken;
 			}
 
+			// tell the server which version of the error message
+			// catalog we have, so it can send compact form errors
+			//
+			// NOTE: unlike the CSRF check above, this accepts full
+			// URLs on this site, since form actions always are
+			var same_origin = this._is_same_origin(new_opts.url);
+			if (same_origin)
+			{
+				this._load_error_catalog();
+				if (this._error_catalog != null)
+				{
+					if (typeof(new_opts.headers) == 'undefined')
+						new_opts.headers = {};
+					new_opts.headers['X-Sculpt-Error-Catalog'] = this._error_catalog.version;
+				}
+			}
+
+			// tell the server which HTML fragments we're showing, so
+			// it can skip sending any that haven't changed (see
+			// update_html)
+			if (same_origin)
+			{
+				var fragments = this._fragment_hashes();
+				if (fragments != '')
+				{
+					if (typeof(new_opts.headers) == 'undefined')
+						new_opts.headers = {};
+					new_opts.headers['X-Sculpt-Fragments'] = fragments;
+				}
+			}
+
+			// callers that may issue several requests for the same
+			// thing (e.g. partial validation) can supply an is_stale
+			// function; if it returns true when the response arrives,
+			// the response is dropped without invoking any handlers
+			var is_stale = new_opts.is_stale;
+			delete new_opts.is_stale;
+
+			// send this along with others, if we can
+			var batch = new_opts.batch;
+			delete new_opts.batch;
+			if (batch !== false && this._can_batch(new_opts))
+				return this._queue_batch(new_opts, success, failure, show_busy, fail_silently, is_stale);
+
 			// if we are going to show a "busy" indicator, it would go here
 
 			// make the request
@@ -239,14 +299,181 @@
 			// we are going to pass in the given callbacks
 			var that = this;				// the inline functions below run with a different "this" context, so alias it
 			jqXHR.done(function(data, status, jqXHR) {
+				if (typeof(is_stale) == "function" && is_stale())
+					return;
 				return that._ajax_success(success, failure, fail_silently, show_busy, data, status, jqXHR);
 			}).fail(function(jqXHR, status, message) {
+				if (typeof(is_stale) == "function" && is_stale())
+					return;
 				return that._ajax_failure(success, failure, fail_silently, show_busy, jqXHR, status, message);
 			});
 
 			return jqXHR;
 		},
 
+		// whether a call can be sent in a batch: it has to be
+		// an ordinary form POST to this site
+		'_can_batch': function (opts) {
+			if (this.batch_url == null)
+				return false;
+			if (opts.type.toUpperCase() != 'POST' || !this._is_same_origin(opts.url))
+				return false;
+			if (opts.processData === false || typeof(opts.xhr) != 'undefined' || typeof(opts.contentType) != 'undefined')
+				return false;
+			if (typeof(window.FormData) != 'undefined' && opts.data instanceof window.FormData)
+				return false;
+			return true;
+		},
+
+		// add a call to the next batch, starting the batch timer
+		// if this is the first; returns the call's abort handle
+		'_queue_batch': function (opts, success, failure, show_busy, fail_silently, is_stale) {
+			var data = opts.data;
+			if (data == null)
+				data = '';
+			else if (typeof(data) != 'string')
+				data = $.param(data);
+
+			// only our own headers are passed on; the batch request
+			// carries the CSRF token for all of them
+			var headers = {};
+			if (typeof(opts.headers) != 'undefined')
+			{
+				for (var name in opts.headers)
+				{
+					if (name.match(/^x-sculpt-/i))
+						headers[name] = opts.headers[name];
+				}
+			}
+
+			var call = {
+				'opts': opts,
+				'jqXHR': null,					// set if the call is sent on its own after all
+				'request': { 'url': opts.url, 'data': data, 'headers': headers },
+				'timeout': opts.timeout,
+				'success': success,
+				'failure': failure,
+				'show_busy': show_busy,
+				'fail_silently': fail_silently,
+				'is_stale': is_stale,
+				'aborted': false
+			};
+			this._batch_queue.push(call);
+
+			var that = this;
+			if (this._batch_queue.length >= this.batch_max)
+			{
+				if (this._batch_timer != null)
+					window.clearTimeout(this._batch_timer);
+				this._send_batch();
+			}
+			else if (this._batch_timer == null)
+				this._batch_timer = window.setTimeout(function () { that._send_batch(); }, this.batch_delay);
+
+			// aborting a call behaves as aborting its own request
+			// would: its response (if any) is dropped and it fails
+			return {
+				'abort': function () {
+					if (call.aborted)
+						return;
+					call.aborted = true;
+					if (call.jqXHR != null)
+					{
+						call.jqXHR.abort();
+						return;
+					}
+					if (typeof(call.is_stale) == "function" && call.is_stale())
+						return;
+					that._ajax_failure(call.success, call.failure, call.fail_silently, call.show_busy, { 'status': 0, 'statusText': 'abort' }, 'abort', 'abort');
+				}
+			};
+		},
+
+		// send the waiting calls as one request and hand each
+		// its own response
+		'_send_batch': function () {
+			this._batch_timer = null;
+			var calls = $.grep(this._batch_queue, function (call) { return !call.aborted; });
+			this._batch_queue = [];
+			if (calls.length == 0)
+				return;
+
+			var requests = [];
+			var timeout = 0;
+			for (var i = 0; i < calls.length; i++)
+			{
+				requests.push(calls[i].request);
+				timeout = Math.max(timeout, calls[i].timeout);
+			}
+
+			var opts = {
+				url: this.batch_url,
+				type: 'POST',
+				accepts: 'application/json',
+				dataType: 'json',
+				contentType: 'application/json',
+				data: JSON.stringify({ 'requests': requests }),
+				timeout: timeout
+			};
+			if (this.cookies && this.cookies.csrftoken)
+				opts.headers = { 'X-CSRFToken': this.cookies.csrftoken };
+
+			var that = this;
+			$.ajax(opts).done(function(data, status, jqXHR) {
+				var responses = (data && $.isArray(data.responses)) ? data.responses : [];
+				for (var i = 0; i < calls.length; i++)
+					that._batch_call_done(calls[i], responses[i], jqXHR);
+			}).fail(function(jqXHR, status, message) {
+				for (var i = 0; i < calls.length; i++)
+				{
+					var call = calls[i];
+					if (call.aborted || (typeof(call.is_stale) == "function" && call.is_stale()))
+						continue;
+					that._ajax_failure(call.success, call.failure, call.fail_silently, call.show_busy, jqXHR, status, message);
+				}
+			});
+		},
+
+		// handle one call's response from a batch; the handlers
+		// get a stand-in for the call's own jqXHR, with its status
+		// and the batch's jqXHR as batch_jqXHR
+		'_batch_call_done': function (call, response, batch_jqXHR) {
+			if (call.aborted || (typeof(call.is_stale) == "function" && call.is_stale()))
+				return;
+
+			if (response == undefined)
+			{
+				// the batch response didn't make sense
+				this._ajax_failure(call.success, call.failure, call.fail_silently, call.show_busy, batch_jqXHR, 'parsererror', null);
+				return;
+			}
+
+			if (response.unbatchable)
+			{
+				// the server won't run this view in a batch; send
+				// the call on its own
+				call.jqXHR = this.ajax($.extend({}, call.opts, { 'batch': false, 'is_stale': call.is_stale }), call.success, call.failure, call.show_busy, call.fail_silently);
+				return;
+			}
+
+			var jqXHR = { 'status': response.status, 'batch_jqXHR': batch_jqXHR };
+			if (response.body == null)
+				this._ajax_failure(call.success, call.failure, call.fail_silently, call.show_busy, jqXHR, 'error', 'HTTP ' + response.status);
+			else
+				this._ajax_success(call.success, call.failure, call.fail_silently, call.show_busy, response.body, 'success', jqXHR);
+		},
+
+		// whether a URL is on this site: relative, or absolute with
+		// this page's scheme, host and port
+		'_is_same_origin': function (url) {
+			if (!url.match(/^([a-z][a-z0-9+.\-]*:)?\/\//i))
+				return true;
+			var origin = window.location.protocol + '//' + window.location.host;
+			if (url.match(/^\/\//))
+				url = window.location.protocol + url;
+			return url.toLowerCase() == origin.toLowerCase() || url.substr(0, origin.length + 1).toLowerCase() == origin.toLowerCase() + '/';
+		},
+
 		// whenever an AJAX method "succeeds", this is called; this includes
 		// all cases in types 4, 5, and 6 defined above
 		'_ajax_success': function (success, failure, fail_silently, show_busy, data, status, jqXHR) {
@@ -269,6 +496,14 @@
 				});
 			}
 
+			//
+			// the server knew this request had been superseded
+			// by a later one and didn't process it; there is
+			// nothing to do
+			//
+			if (data.superseded != undefined)
+				return;
+
 			//
 			// success-but-failure modes (type 4)
 			//
@@ -537,8 +772,13 @@
 				update_item = update_list[i];
 				var obj = $('#'+update_item.id);
 				
+				if (update_item.not_modified)
+				{
+					// the server says we already have the right
+					// HTML (see _fragment_hashes); leave it alone
+				}
 				// append, prepend, or replace
-				if (update_item.mode == 'append')
+				else if (update_item.mode == 'append')
 					obj.append(update_item.html);
 				else if (update_item.mode == 'prepend')
 					obj.prepend(update_item.html);
@@ -547,11 +787,37 @@
 				else if (update_item.mode == 'remove')
 				{
 					obj.remove();
-					return;				// no class updates on removed object
+					continue;			// no class updates on removed object
+				}
+				else if (update_item.mode == 'patch')
+				{
+					// only what changed since the HTML we have; if it
+					// doesn't fit, forget our hash so the server sends
+					// the full HTML next time, and let the page know
+					// in case it wants that straight away
+					if (!this._apply_patch(obj, update_item.patch, update_item.count))
+					{
+						console.error('ERROR: could not apply HTML patch to #' + update_item.id);
+						update_item.hash = undefined;
+						obj.trigger('sculpt-patch-failed', [ update_item ]);
+					}
 				}
 				else
 					obj.html(update_item.html);
 
+				// remember the hash of what we're now showing; if
+				// there isn't one, the content no longer matches
+				// any hash we had
+				if (!update_item.not_modified)
+				{
+					if (update_item.mode == 'replace')
+						obj = $('#'+update_item.id);	// the replacement
+					if (update_item.hash != undefined)
+						obj.attr('data-sculpt-hash', update_item.hash);
+					else
+						obj.removeAttr('data-sculpt-hash');
+				}
+
 				// add/remove classes, if requested
 				// NOTE: you may find replace mode more
 				// effective than manipulating classes
@@ -560,10 +826,67 @@
 				if (update_item.class_remove != undefined)
 					obj.removeClass(update_item.class_remove);
 
-				this._init_chosen($('#'+update_item.id)[0]);	// set up chosen on any selects in fresh HTML
+				if (!update_item.not_modified)
+					this._init_chosen($('#'+update_item.id)[0]);	// set up chosen on any selects in fresh HTML
 			}
 		},
 
+		// apply a 'patch' mode update to an element's child nodes;
+		// the patch is a list of operations, applied in order:
+		//
+		//	['k', n]		keep the next n nodes
+		//	['d', n]		delete the next n nodes
+		//	['i', html]		insert html here
+		//
+		// and any nodes left over at the end are kept. Nodes that
+		// are kept aren't touched at all, so scroll position,
+		// widgets and focus within them survive the update.
+		//
+		// returns false (without changing anything) if the element
+		// doesn't have the number of child nodes the patch expects
+		'_apply_patch': function (obj, patch, count) {
+			var element = obj[0];
+			if (element == undefined || element.childNodes.length != count)
+				return false;
+
+			var old_nodes = $.makeArray(element.childNodes);
+			var position = 0;
+			for (var i = 0; i < patch.length; i++)
+			{
+				var op = patch[i];
+				if (op[0] == 'k')
+					position += op[1];
+				else if (op[0] == 'd')
+				{
+					for (var j = 0; j < op[1]; j++)
+						element.removeChild(old_nodes[position + j]);
+					position += op[1];
+				}
+				else if (op[0] == 'i')
+				{
+					// jQuery knows how to parse fragments like table
+					// rows that can't stand on their own
+					var new_nodes = $.parseHTML(op[1], document, true);
+					var before = position < old_nodes.length ? old_nodes[position] : null;
+					for (var j = 0; j < new_nodes.length; j++)
+						element.insertBefore(new_nodes[j], before);
+				}
+			}
+			return true;
+		},
+
+		// the hashes of the HTML fragments we're showing, as
+		// the X-Sculpt-Fragments header value ("id:hash id:hash");
+		// these were sent by the server with earlier updates
+		'_fragment_hashes': function () {
+			var fragments = [];
+			$('[data-sculpt-hash]').each(function () {
+				if (this.id)
+					fragments.push(this.id + ':' + $(this).attr('data-sculpt-hash'));
+			});
+			return fragments.join(' ');
+		},
+
 		//
 		// COOKIE ACCESS
 		//
@@ -652,6 +975,7 @@
 				// we make sure to pluck it from function parameters
 				e.preventDefault();			// do not let the form submit normally; we are doing that here
 				that._skip_partial_validation = this.id;	// this form should not be partially-validated due to blur as we're fully-validating it
+				that._cancel_partial_validation(this);		// nor should any partial validation still waiting to be sent
 				if (this.id in that.auto_form_handlers)
 				{
 					if (typeof(that.auto_form_handlers[this.id].prepare) == "function")
@@ -716,11 +1040,13 @@
 				// back on an earlier field (e.g. to correct a mistake
 				// we've highlighted for them)
 				//
-				// the "last" field is tricky to extract and, since we
-				// extract it in DOM order, may not match the field order
-				// stored on the server; since eventually all fields will
-				// be validated, we can live with the potential for
-				// inconsistency (for now)
+				// the "last" field is determined by the field order
+				// the server gave us (see _field_position); forms
+				// that don't provide one fall back on DOM order,
+				// which may not match the field order stored on the
+				// server; since eventually all fields will be
+				// validated, we can live with the potential for
+				// inconsistency in that case
 				//
 				var last_field = $(form).data('lastField');
 				if (last_field == undefined)
@@ -733,8 +1059,16 @@
 				else
 				{
 					// we have one; see if the current focus field is
-					// "after" it by comparing their DOM positions
-					if ($(last_field).isBefore($(ff)))
+					// "after" it
+					var last_position = that._field_position(form, last_field.name);
+					var ff_position = that._field_position(form, ff.name);
+					var is_after;
+					if (last_position != null && ff_position != null)
+						is_after = ff_position > last_position;
+					else
+						is_after = $(last_field).isBefore($(ff));	// compare DOM positions
+
+					if (is_after)
 					{
 						// this new field is farther into the form
 						// than the previous last field
@@ -743,11 +1077,98 @@
 					}
 				}
 
+				// check what we can locally; if that's conclusive,
+				// there's no need to ask the server
+				var result = that._prevalidate_field(form, ff);
+				if (result != null && (result.errors.length > 0 || result.complete))
+				{
+					that._show_prevalidation(form, ff, result);
+					return;
+				}
+
 				// submit the form via AJAX and handle the results internally
-				that.ajax_form($(form), null, null, false, ff.name, last_field.name);
+				that._queue_partial_validation(form, ff.name, last_field.name);
 			});
 		},
 
+		// partial validation requests can be coalesced: with a
+		// partial_validation_batch_delay set, every field the user
+		// leaves within that delay is collected and sent in a single
+		// request, which the server validates once through the
+		// farthest field
+		'_queue_partial_validation': function (form, focus_field, last_field) {
+			var batch = $(form).data('sculptPartialBatch');
+			if (batch == undefined)
+			{
+				batch = { 'fields': [], 'timer': null };
+				$(form).data('sculptPartialBatch', batch);
+			}
+
+			if ($.inArray(focus_field, batch.fields) < 0)
+				batch.fields.push(focus_field);
+			batch.focus_field = focus_field;
+			batch.last_field = last_field;
+
+			if (batch.timer != null)
+				window.clearTimeout(batch.timer);
+
+			var that = this;
+			var send = function () {
+				batch.timer = null;
+
+				// the tracked last field goes at the end of the
+				// list; the server uses it if it can't sort the
+				// fields itself
+				var fields = $.grep(batch.fields, function (name) { return name != batch.last_field; });
+				fields.push(batch.last_field);
+				batch.fields = [];
+
+				that.ajax_form($(form), null, null, false, batch.focus_field, fields.join(','));
+			};
+
+			if (this.partial_validation_batch_delay > 0)
+				batch.timer = window.setTimeout(send, this.partial_validation_batch_delay);
+			else
+				send();
+		},
+
+		// drop any partial validation waiting to be sent for a form
+		'_cancel_partial_validation': function (form) {
+			var batch = $(form).data('sculptPartialBatch');
+			if (batch != undefined)
+			{
+				if (batch.timer != null)
+					window.clearTimeout(batch.timer);
+				batch.timer = null;
+				batch.fields = [];
+			}
+		},
+
+		// find the position of a field (by name) in the server's
+		// field order, which AjaxForm supplies in the form's
+		// data-sculpt-field-order attribute; returns null if the
+		// form has no order or the field isn't in it
+		'_field_position': function (form, field_name) {
+			var positions = $(form).data('sculptFieldPositions');
+			if (positions == undefined)
+			{
+				// build the name -> position lookup once per form
+				positions = {};
+				var order = $(form).attr('data-sculpt-field-order');
+				if (order)
+				{
+					order = order.split(' ');
+					for (var i = 0; i < order.length; i++)
+						positions[order[i]] = i;
+				}
+				$(form).data('sculptFieldPositions', positions);
+			}
+
+			if (positions.hasOwnProperty(field_name))
+				return positions[field_name];
+			return null;
+		},
+
 		// actually submit a form; pulled into its own function so that
 		// if you programmatically need to submit an existing form, you
 		// can and still get the AJAX functionality
@@ -761,22 +1182,44 @@
 		// is to either present validation errors (handled for you) or
 		// to redirect to a new page (handled for you)
 		//
+		// NOTE: for partial validation, last_field may be a comma-
+		// separated list of field names; the server validates through
+		// whichever of them is farthest into the form
+		//
 		'ajax_form': function (f, success, failure, show_busy, focus_field, last_field) {
 			var is_partial = (typeof(last_field) != 'undefined');
 			var post_data = f.serialize();
 			var action = f[0].action;
+			var opts = {};
 
 			if (is_partial)
+			{
 				// tell the server this is partial (assumes no other GET params)
 				action += '?_partial='+last_field+'&_focus='+focus_field;
+
+				// each partial validation supersedes any earlier
+				// one for the same form: abort the earlier request
+				// and drop its response if it arrives anyway, and
+				// number the requests so the server can skip work
+				// on one it knows is out of date
+				var seq = this._supersede_partial_validation(f[0]);
+				opts.headers = { 'X-Sculpt-Sequence': this._page_token + '.' + (f[0].id || f[0].action) + ':' + seq };
+				opts.is_stale = function () { return f.data('sculptPartialSeq') != seq; };
+			}
 			else
+			{
+				// a full submission makes any partial validation
+				// in flight irrelevant
+				this._supersede_partial_validation(f[0]);
+
 				// only clear the fields now if we're fully-submitting
 				this.clear_form_errors(f, true);
+			}
 
-			this.ajax({
-				'url': action,
-				'data': post_data
-			}, function(succeeded, data, status, message, jqXHR) {
+			opts.url = action;
+			opts.data = post_data;
+
+			var jqXHR = this.ajax(opts, function(succeeded, data, status, message, jqXHR) {
 				// partial validation should not process either
 				// close or clear classes as the form isn't complete
 				if (is_partial)
@@ -802,7 +1245,28 @@
 				// one was provided
 				if (typeof(success) == "function")
 					success(succeeded, data, status, message, jqXHR);
-			}, failure, show_busy);
+			}, failure, show_busy, false);	// superseded partial validations are dropped by is_stale
+
+			if (is_partial)
+				f.data('sculptPartialXHR', jqXHR);
+		},
+
+		// bump a form's partial validation sequence number and
+		// abort any partial validation request still in flight;
+		// returns the new sequence number
+		'_supersede_partial_validation': function (form) {
+			var f = $(form);
+			var seq = (f.data('sculptPartialSeq') || 0) + 1;
+			f.data('sculptPartialSeq', seq);
+
+			var jqXHR = f.data('sculptPartialXHR');
+			if (jqXHR != undefined)
+			{
+				f.removeData('sculptPartialXHR');
+				jqXHR.abort();
+			}
+
+			return seq;
 		},
 
 		// clear all the error markers from a form
@@ -868,7 +1332,7 @@
 				var field_messages = [];
 				for (j = 0; j < field_errors.length; j++)
 				{
-					var message = field_errors[j];
+					var message = this._expand_form_error(field_errors[j]);
 					var field_message = message;
 
 					// substitute in the full field name
@@ -892,30 +1356,8 @@
 					field_messages[field_messages.length] = this.messages.ajax_field_error_item.replace(/__error_item__/g, field_message);
 				}
 
-				// mark the input with an error class
-				var ff = $('#id_'+field_name);
-				ff.addClass('error');
-
-				// add tooltips
-				// ****TODO: use top for selects
-				// extra wrinkle: just blindly setting the tooltip looks
-				// ugly if it's currently being displayed and it hasn't
-				// changed--it blinks, which is visually distracting.
-				// check to see if it's changed before setting it
-				var tt_message = this.messages.ajax_field_error.replace(/__error_list__/g, field_messages.join("\n"));
-				var tt_data = ff.data('bs.tooltip');	// fetch Bootstrap Tooltip object
-				if (tt_data == undefined || tt_data.getTitle() != tt_message)
-				{
-					ff.tooltip({
-						'html': true,
-						'placement':  'bottom',
-						'title': tt_message,
-						'trigger': 'focus'	// default is "hover focus" but hover causes tooltip to disappear on casual mouse movement
-					});
-				}
-
-				// and mark the control group for Bootstrap 3
-				ff.closest('.form-group').addClass('has-error');
+				// mark the input and its form group
+				this._mark_field_error($('#id_'+field_name), field_messages);
 			}
 
 			// mark all the non-error, non-warning fields with a
@@ -972,6 +1414,219 @@
 			}
 		},
 
+		// mark a single field as having errors, given its list of
+		// already-formatted field messages
+		'_mark_field_error': function (ff, field_messages) {
+			// mark the input with an error class
+			ff.addClass('error');
+
+			// add tooltips
+			// ****TODO: use top for selects
+			// extra wrinkle: just blindly setting the tooltip looks
+			// ugly if it's currently being displayed and it hasn't
+			// changed--it blinks, which is visually distracting.
+			// check to see if it's changed before setting it
+			var tt_message = this.messages.ajax_field_error.replace(/__error_list__/g, field_messages.join("\n"));
+			var tt_data = ff.data('bs.tooltip');	// fetch Bootstrap Tooltip object
+			if (tt_data == undefined || tt_data.getTitle() != tt_message)
+			{
+				ff.tooltip({
+					'html': true,
+					'placement':  'bottom',
+					'title': tt_message,
+					'trigger': 'focus'	// default is "hover focus" but hover causes tooltip to disappear on casual mouse movement
+				});
+			}
+
+			// and mark the control group for Bootstrap 3
+			ff.closest('.form-group').addClass('has-error');
+		},
+
+		// expand a server-style message with its parameters; the
+		// message may be a string or a [singular, plural, param_name]
+		// list, and uses Python's %(name)s / %(name)d placeholders
+		'format_message': function (message, params) {
+			params = params || {};
+			if ($.isArray(message))
+			{
+				// the parameter that decides between singular and
+				// plural; with no name given, assume plural
+				if (message.length > 2 && params[message[2]] == 1)
+					message = message[0];
+				else
+					message = message[1];
+			}
+
+			return message.replace(/%(?:\(([^)]+)\)[sdif]|%)/g, function (match, name) {
+				if (match == '%%')
+					return '%';
+				return (name in params) ? String(params[name]) : match;
+			});
+		},
+
+		//
+		// COMPACT FORM ERRORS
+		//
+		// When the server has compact form errors enabled, forms carry
+		// a data-sculpt-error-catalog attribute with the URL of its
+		// error message catalog. We load that once (it's versioned, so
+		// the browser can cache it) and tell the server which version
+		// we have; from then on, form errors that use catalog messages
+		// arrive as [catalog key, params] and we expand them here.
+		//
+
+		// load the catalog, if there is one and we haven't already
+		'_load_error_catalog': function () {
+			if (this._error_catalog_loading)
+				return;
+			var url = $('[data-sculpt-error-catalog]').first().attr('data-sculpt-error-catalog');
+			if (!url)
+				return;
+
+			this._error_catalog_loading = true;
+			var that = this;
+			$.ajax({ 'url': url, 'type': 'GET', 'dataType': 'json', 'cache': true })
+				.done(function (data) {
+					that._error_catalog = data;
+				})
+				.fail(function () {
+					// without the catalog we just get full messages
+					that._error_catalog_loading = false;
+				});
+		},
+
+		// a form error, as text; compact errors are expanded from
+		// the catalog
+		'_expand_form_error': function (error) {
+			if (!$.isArray(error))
+				return error;
+			var message = this._error_catalog ? this._error_catalog.messages[error[0]] : undefined;
+			if (message == undefined)
+				return error[0];	// shouldn't happen; the server checks our version
+			return this.format_message(message, error[1]);
+		},
+
+		//
+		// CLIENT-SIDE VALIDATION
+		//
+		// Forms with client_validation enabled describe their simple
+		// field rules in a data-sculpt-validation attribute (see
+		// AjaxForm.get_client_validation_schema). On focusout we check
+		// the field against those rules first; if it fails, or if
+		// the rules are all the server would check, we show the
+		// result here and skip the partial validation round trip.
+		//
+
+		// check a single field; returns null if there are no rules
+		// for it, or { 'errors': [messages], 'complete': bool }
+		'_prevalidate_field': function (form, ff) {
+			var schema = $(form).data('sculptValidation');
+			if (schema == undefined)
+			{
+				schema = $(form).attr('data-sculpt-validation');
+				schema = schema ? $.parseJSON(schema) : {};
+				$(form).data('sculptValidation', schema);
+			}
+
+			var rules = schema[ff.name];
+			if (rules == undefined || ff.type == 'file' || ff.type == 'checkbox' || ff.type == 'radio')
+				return null;
+
+			var value = $(ff).val();
+			if ($.isArray(value) || value == null)
+				return null;	// multiple selects are beyond us
+			if (rules.strip)
+				value = $.trim(value);
+
+			// Django's number fields ignore surrounding spaces
+			// (but spaces alone aren't a number)
+			var is_numeric = (rules.type == 'integer' || rules.type == 'number');
+			var blank_number = false;
+			if (is_numeric)
+			{
+				blank_number = (value !== '' && $.trim(value) === '');
+				value = $.trim(value);
+			}
+
+			var errors = [];
+			var that = this;
+			var fail = function (code, params) {
+				errors.push(that.format_message(rules.messages[code], params));
+			};
+
+			if (blank_number)
+				fail('invalid');
+			else if (value === '')
+			{
+				// empty values are only checked for being required
+				if (rules.required)
+					fail('required');
+			}
+			else
+			{
+				var number = null;
+				if (rules.type == 'integer')
+				{
+					// IntegerField also takes a zero fraction ("5.0")
+					if (/^[-+]?\d+(\.0*)?$/.test(value))
+						number = parseInt(value, 10);
+					else
+						fail('invalid');
+				}
+				else if (rules.type == 'number')
+				{
+					if (/^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$/.test(value))
+						number = parseFloat(value);
+					else
+						fail('invalid');
+				}
+
+				if (number != null && rules.min_value != undefined && number < rules.min_value)
+					fail('min_value', { 'limit_value': rules.min_value, 'show_value': number });
+				if (number != null && rules.max_value != undefined && number > rules.max_value)
+					fail('max_value', { 'limit_value': rules.max_value, 'show_value': number });
+				var length = this._value_length(value);
+				if (rules.min_length != undefined && length < rules.min_length)
+					fail('min_length', { 'limit_value': rules.min_length, 'show_value': length });
+				if (rules.max_length != undefined && length > rules.max_length)
+					fail('max_length', { 'limit_value': rules.max_length, 'show_value': length });
+				if (rules.regex != undefined && !(new RegExp(rules.regex)).test(value))
+					fail('invalid');
+			}
+
+			return { 'errors': errors, 'complete': rules.complete };
+		},
+
+		// the length of a value as the server will count it: in
+		// code points, not UTF-16 units (so a character outside the
+		// Basic Multilingual Plane, like most emoji, counts once), and
+		// with each line break as the CR LF the form is submitted with
+		'_value_length': function (value) {
+			return value.replace(/[\uD800-\uDBFF][\uDC00-\uDFFF]/g, '_').replace(/\r?\n/g, '\r\n').length;
+		},
+
+		// show the result of a client-side check on a single field,
+		// leaving every other field's state alone
+		'_show_prevalidation': function (form, ff, result) {
+			var f = $(ff);
+			var fg = f.closest('.form-group');
+			fg.removeClass('has-error has-warning has-success');
+			f.removeClass('error');
+
+			if (result.errors.length > 0)
+			{
+				var field_messages = [];
+				for (var i = 0; i < result.errors.length; i++)
+					field_messages.push(this.messages.ajax_field_error_item.replace(/__error_item__/g, result.errors[i].replace(/__fieldname__/g, 'This')));
+				this._mark_field_error(f, field_messages);
+			}
+			else
+			{
+				fg.addClass('has-success');
+				f.tooltip('destroy');
+			}
+		},
+
 		//
 		// FILE UPLOAD
 		//
@@ -1419,6 +2074,7 @@
 		// Just invoke this once.
 		//
 		'init': function () {
+			this._page_token = Math.random().toString(36).substr(2, 8);	// distinguishes this page load's request sequences from earlier ones
 			this.extract_cookies();
 			this._wrap_console();
 			this._wrap_forms();
@@ -1426,6 +2082,7 @@
 			this._init_toast();
 			//this._init_chosen(document);
 			this._init_live_update();
+			this._load_error_catalog();
 		}
 
 	};
@@ -0,0 +1,49 @@
+from django.conf import settings
+
+import importlib
+
+#
+# statistics hook
+#
+# Some parts of sculpt-ajax (fragment caching, for example) report
+# what they're doing so you can feed it into your own metrics.
+# Set SCULPT_AJAX_STATS_HOOK to the dotted path of a callable:
+#
+#   SCULPT_AJAX_STATS_HOOK = 'myproject.metrics.sculpt_ajax_event'
+#
+# which is called as hook(event_name, **data) for each event. The
+# hook must be fast and must not raise; it's called inline, in the
+# middle of building a response. If no hook is configured, events
+# are simply discarded.
+#
+# Events:
+#
+#   fragment_cache_hit      template_name, key, backend
+#   fragment_cache_miss     template_name, key, backend
+#   response_compressed     path, encoding, original_size,
+#                           compressed_size
+#   request_timing          view, path, phases, total (see
+#                           sculpt.ajax.timing)
+#   exception_summary       fingerprint, title, path, reported,
+#                           suppressed (see sculpt.ajax.error_reporting)
+#
+
+# the hook, once imported; False means there isn't one
+_hook = None
+
+def get_hook():
+    global _hook
+    if _hook == None:
+        hook_name = getattr(settings, 'SCULPT_AJAX_STATS_HOOK', None)
+        if hook_name:
+            module_name, _, function_name = hook_name.rpartition('.')
+            _hook = getattr(importlib.import_module(module_name), function_name)
+        else:
+            _hook = False
+    return _hook
+
+# report an event
+def emit(event_name, **data):
+    hook = get_hook()
+    if hook:
+        hook(event_name, **data)
@@ -0,0 +1,168 @@
+from django.conf import settings
+
+from collections import OrderedDict
+from sculpt.ajax.stats import emit
+
+import threading
+import time
+
+#
+# per-phase request timing
+#
+# With SCULPT_AJAX_TIMING on, AjaxView times the phases of each
+# request (prepare_request, prepare_context, form construction,
+# validation, process_form, template rendering, JSON encoding)
+# and reports them:
+#
+#   - as a Server-Timing header, which browser developer tools
+#     show alongside the request
+#   - as a request_timing event (see sculpt.ajax.stats), with the
+#     view, path, phases (name -> milliseconds) and total
+#
+# SCULPT_AJAX_TIMING may be True, or a dict with these optional
+# keys:
+#
+#   header          send the Server-Timing header (default True;
+#                   turn it off if you'd rather not reveal timings
+#                   to clients)
+#
+# Views time their steps with laps: timer.lap(name) records the
+# time since the previous lap (or mark) under name, and repeated
+# names add up. Work that happens inside a step (rendering and
+# JSON encoding) is also timed on its own with timer.phase(name),
+# so those phases are included in the step that contains them
+# as well.
+#
+# When timing is off, the timer is a NullTimer whose methods do
+# nothing, so the cost is a method call per step.
+#
+
+# a timer that does nothing
+class NullTimer(object):
+    enabled = False
+
+    def lap(self, name):
+        pass
+
+    def mark(self):
+        pass
+
+    def phase(self, name):
+        return _null_phase
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_phase = _NullPhase()
+
+NULL_TIMER = NullTimer()
+
+# a timer that records phases
+class PhaseTimer(object):
+    enabled = True
+
+    def __init__(self):
+        self.started = time.time()
+        self.last_lap = self.started
+        self.phases = OrderedDict()     # name -> seconds
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    # record the time since the last lap
+    def lap(self, name):
+        now = time.time()
+        self.add(name, now - self.last_lap)
+        self.last_lap = now
+
+    # start the next lap now, without recording the time
+    # since the last one
+    def mark(self):
+        self.last_lap = time.time()
+
+    # time a block of code
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def total(self):
+        return time.time() - self.started
+
+    # the phases (and total) as a Server-Timing header value
+    def server_timing(self):
+        entries = [ '%s;dur=%.1f' % (name, seconds * 1000) for name, seconds in self.phases.iteritems() ]
+        entries.append('total;dur=%.1f' % (self.total() * 1000))
+        return ', '.join(entries)
+
+class _Phase(object):
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.add(self.name, time.time() - self.started)
+        return False
+
+#
+# the current request's timer
+#
+# Views have theirs as self.timer; code that doesn't know about
+# the view (response construction) finds it with get_timer().
+#
+
+_local = threading.local()
+
+def get_timer():
+    return getattr(_local, 'timer', NULL_TIMER)
+
+# the options, or False if timing is off; read once
+_options = None
+
+def get_options():
+    global _options
+    if _options == None:
+        options = getattr(settings, 'SCULPT_AJAX_TIMING', False)
+        if not options:
+            _options = False
+        else:
+            if options is True:
+                options = {}
+            _options = {
+                    'header': options.get('header', True),
+                }
+    return _options
+
+# start timing a request; returns the timer (a NullTimer if
+# timing is off)
+def start_timer():
+    if not get_options():
+        return NULL_TIMER
+    timer = PhaseTimer()
+    _local.timer = timer
+    return timer
+
+# finish timing a request: report the results and add the header
+# to the response (if there is one)
+def finish_timer(timer, view, request, response):
+    _local.timer = NULL_TIMER
+    if not timer.enabled:
+        return
+
+    if response != None and get_options()['header']:
+        response['Server-Timing'] = timer.server_timing()
+
+    emit('request_timing',
+            view = view.__class__.__module__ + '.' + view.__class__.__name__,
+            path = request.path,
+            phases = OrderedDict([ (name, seconds * 1000) for name, seconds in timer.phases.iteritems() ]),
+            total = timer.total() * 1000,
+        )
@@ -0,0 +1,14 @@
+from django.conf.urls import url
+
+from sculpt.ajax.views import AjaxBatchView, ErrorCatalogView
+
+# URLs for the views sculpt-ajax provides itself; include these
+# if you use compact form errors (SCULPT_AJAX_COMPACT_FORM_ERRORS)
+# or request batching (AjaxBatchView)
+#
+#   url(r'^sculpt-ajax/', include('sculpt.ajax.urls')),
+#
+urlpatterns = [
+        url(r'^error-catalog/(?P<language>[\w-]+)/(?P<version>\w+)\.json$', ErrorCatalogView.as_view(), name = 'sculpt_ajax_error_catalog'),
+        url(r'^batch/$', AjaxBatchView.as_view(), name = 'sculpt_ajax_batch'),
+    ]
@@ -1,12 +1,29 @@
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.core.cache import caches
+from django.core.urlresolvers import Resolver404, get_script_prefix, resolve
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, QueryDict
 from django.shortcuts import render
 from django.template import RequestContext, Context
 from django.template.loader import get_template, render_to_string
+from django.utils.datastructures import MultiValueDict
+from django.utils.encoding import smart_bytes
+from django.utils.translation import check_for_language
 from django.views.generic import View
 
-from sculpt.ajax.forms import AjaxFormAliasMixin
-from sculpt.ajax.responses import AjaxSuccessResponse, AjaxHTMLResponse, AjaxModalResponse, AjaxRedirectResponse, AjaxMixedResponse, AjaxErrorResponse, AjaxExceptionResponse, AjaxFormErrorResponse
+from sculpt.ajax.compression import compress_response, get_compression_options
+from sculpt.ajax.dumping import dump_ajax
+from sculpt.ajax.error_reporting import report_exception
+from sculpt.ajax.forms import AjaxFormAliasMixin, error_message_catalog
+from sculpt.ajax.responses import AjaxSuccessResponse, AjaxHTMLResponse, AjaxModalResponse, AjaxRedirectResponse, AjaxMixedResponse, AjaxErrorResponse, AjaxExceptionResponse, AjaxFormErrorResponse, AjaxSupersededResponse, AjaxStreamingHTMLResponse, ResponsePlan, accepts_compact_form_errors
+from sculpt.ajax.timing import NULL_TIMER, finish_timer, start_timer
+
+import copy
+import hashlib
+import json
+import sys
+import time
+import traceback
+import urlparse
 
 from collections import OrderedDict
 
@@ -49,6 +66,33 @@ class AjaxView(base_view_class):
     # shown instead of blowing up client-side code
     wrap_exceptions_methods = [ 'POST' ]
 
+    # response compression for this view: None to follow
+    # SCULPT_AJAX_COMPRESSION, False to turn it off, or a dict
+    # of options to override (see sculpt.ajax.compression)
+    compression = None
+
+    # whether requests to this view may be sent to AjaxBatchView
+    # along with others; set this to False for views that depend
+    # on middleware running for their own request, as requests in
+    # a batch skip it (views with their own compression settings
+    # are never batched either)
+    batchable = True
+
+    # the timer for this request's phases; a NullTimer unless
+    # SCULPT_AJAX_TIMING is on (see sculpt.ajax.timing)
+    timer = NULL_TIMER
+
+    # time the whole request, if timing is on, and report the
+    # phases once the response is ready
+    def dispatch(self, request, *args, **kwargs):
+        self.timer = start_timer()
+        response = None
+        try:
+            response = self.dispatch_ajax(request, *args, **kwargs)
+            return response
+        finally:
+            finish_timer(self.timer, self, request, response)
+
     # special handling: if an exception occurs in an AJAX POST, we
     # DO NOT want to return an exception as Django's default HTML-
     # formatted response. Instead, catch the exception and return
@@ -56,7 +100,7 @@ class AjaxView(base_view_class):
     # handler because the derived class gets first crack at handling
     # it, and that's the code we need to wrap in try/except. So we
     # do the wrapping here, in dispatch.
-    def dispatch(self, request, *args, **kwargs):
+    def dispatch_ajax(self, request, *args, **kwargs):
 
         # non-POST requests are not wrapped; you're on your own
         # for error handling as we assume a GET request is for the
@@ -66,25 +110,16 @@ class AjaxView(base_view_class):
             
         # otherwise it's a post (or at least something we're
         # supposed to wrap); trap exceptions
+        #
+        # NOTE: with SCULPT_DUMP_AJAX on, each request and its
+        # outcome are recorded (subject to sampling); see
+        # sculpt.ajax.dumping
+        started = time.time()
         try:
-            # spew some debug data, perhaps
-            if settings.SCULPT_DUMP_AJAX:
-                raw_uri = request.META['RAW_URI'] if 'RAW_URI' in request.META else request.META['PATH_INFO']
-                if request.META.get('CONTENT_TYPE') == 'multipart/form-data':
-                    # Django has already parsed the body and dumping a
-                    # full uploaded file's data will not be helpful
-                    print 'AJAX request:', raw_uri, 'MULTIPART: <file upload> +', request.POST
-                else:
-                    # we'd like to print the raw request if we can
-                    if hasattr(request, '_body'):
-                        print 'AJAX request:', raw_uri, 'BODY:', request._body
-                    else:
-                        print 'AJAX request:', raw_uri, 'POST', request.POST
-
             # call the actual POST handler
             results = super(AjaxView, self).dispatch(request, *args, **kwargs)
 
-            if not isinstance(results, JsonResponse):
+            if not isinstance(results, (JsonResponse, AjaxStreamingHTMLResponse)):
                 # we want to make sure all AjaxView handlers return
                 # a response in the correct form; if not, we want
                 # to trap those errors early in development rather
@@ -94,17 +129,27 @@ class AjaxView(base_view_class):
                 # we don't have a backtrace (it's not helpful) and
                 # because it's already formatted as an error response
                 #
+                # NOTE: handlers can't be coroutines; this package
+                # runs under WSGI (and Python 2), so nothing would
+                # ever run one. Say so plainly if a handler returned
+                # something to be awaited.
+                #
                 response = { 'code': 1, 'title': 'Invalid Response Type', 'message': 'Request generated an invalid response type (%s)' % results.__class__.__name__ }
+                if hasattr(results, '__await__') or results.__class__.__name__ in ('coroutine', 'Future', 'Task', 'Deferred'):
+                    response['message'] += '; asynchronous handlers are not supported, handlers must return a response directly'
                 if settings.SCULPT_DUMP_AJAX:
-                    print 'AJAX INVALID RESPONSE TYPE'
-                    print 'original response:', results.__class__.__name__
-                    print results
-                    print 'AJAX result:', response
+                    dump_ajax(self, request, 'invalid', started, response, note = 'original response: %s %r' % (results.__class__.__name__, results))
                 return AjaxErrorResponse(response)
 
             if settings.SCULPT_DUMP_AJAX:
-                print 'AJAX result:', results.content
-            return results
+                if isinstance(results, AjaxFormErrorResponse):
+                    outcome = 'form_error'
+                elif isinstance(results, (AjaxErrorResponse, AjaxExceptionResponse)):
+                    outcome = 'error'
+                else:
+                    outcome = 'success'
+                dump_ajax(self, request, outcome, started, results)
+            return compress_response(request, results, get_compression_options(self.compression))
             
         except Exception, e:
             # decide whether to include backtraces for AJAX exceptions;
@@ -114,11 +159,9 @@ class AjaxView(base_view_class):
             if settings.DEBUG:
                 # sys.exc_info() returns a tuple (type, exception object, stack trace)
                 # traceback.format_exception() formats the result in plain text, as a list of strings
-                import sys
-                import traceback
                 backtrace_text = ''.join(traceback.format_exception(*sys.exc_info()))
                 if settings.SCULPT_DUMP_AJAX:
-                    print backtrace_text
+                    dump_ajax(self, request, 'exception', started, exc_info = sys.exc_info())
                 return AjaxExceptionResponse({ 'code': 0, 'title': e.__class__.__name__, 'message': str(e), 'backtrace': backtrace_text })
                 
             else:
@@ -136,26 +179,60 @@ class AjaxView(base_view_class):
                 #
                 # we're masochists: we'll take door number 2
 
-                # this is how Django logs the exception; see code in
-                # django.core.handlers.base
-                import logging
-                import sys
-                
-                logger = logging.getLogger('django.request')
-                logger.error('Internal Server Error: %s', request.path,
-                    exc_info=sys.exc_info(),
-                    extra={
-                        'status_code': 500,
-                        'request': request
-                    }
-                )
+                # this is how Django logs the exception (see code in
+                # django.core.handlers.base), except that repeats
+                # can be throttled; see sculpt.ajax.error_reporting
+                report_exception(request, sys.exc_info())
 
                 # give back a nice formatted response, AJAX-style
                 response = { 'code': 0, 'title': 'Exception', 'message': 'An exception occurred.' }
                 if settings.SCULPT_DUMP_AJAX:
-                    print repr(response)
+                    dump_ajax(self, request, 'exception', started, response, exc_info = sys.exc_info())
                 return AjaxExceptionResponse(response)
 
+    # the client-side code numbers its partial validation
+    # requests for each form and sends the number in an
+    # X-Sculpt-Sequence header ("<stream>:<number>"); when
+    # SCULPT_AJAX_SEQUENCE_TRACKING is configured, the highest
+    # number seen for each stream is recorded in the cache, so
+    # that a request which arrives after a later one from the
+    # same stream (typically because it was queued behind a slow
+    # request) can be recognized as superseded and skipped
+    #
+    # SCULPT_AJAX_SEQUENCE_TRACKING is a dict with these keys
+    # (all optional):
+    #
+    #   cache       cache alias to use (default 'default')
+    #   timeout     seconds to remember a stream (default 300)
+    #
+    # NOTE: this is advisory; the client already aborts and
+    # ignores superseded requests, this only saves server work.
+    # Requests without a session are never considered superseded.
+    #
+    def is_superseded_request(self, request):
+        options = getattr(settings, 'SCULPT_AJAX_SEQUENCE_TRACKING', None)
+        sequence = request.META.get('HTTP_X_SCULPT_SEQUENCE')
+        if options == None or not sequence:
+            return False
+        session = getattr(request, 'session', None)
+        if session == None or not session.session_key:
+            return False
+
+        stream, sep, number = sequence.rpartition(':')
+        try:
+            number = int(number)
+        except ValueError:
+            return False
+
+        # keep the key short and safe for any cache backend
+        key = 'sculpt_ajax:sequence:' + hashlib.md5(smart_bytes('%s|%s|%s' % (session.session_key, request.path, stream))).hexdigest()
+        cache = caches[options.get('cache', 'default')]
+        latest = cache.get(key)
+        if latest != None and latest > number:
+            return True
+        cache.set(key, number, options.get('timeout', 300))
+        return False
+
 # an AJAX response-generating view
 #
 # This is a generic view that expects derived classes to
@@ -169,6 +246,54 @@ class AjaxResponseView(AjaxView):
     toast = None
     updates = None
 
+    # set this to stream the response when there are only
+    # HTML updates to send (no modal or toast); see
+    # AjaxStreamingHTMLResponse
+    stream_updates = False
+
+    # set this to render the HTML updates concurrently, if
+    # SCULPT_AJAX_CONCURRENT_RENDERING is configured; see
+    # sculpt.ajax.concurrency
+    concurrent_updates = False
+
+    # the modal, toast and updates configuration compiled
+    # by as_view(); see ResponsePlan
+    _response_plan = None
+
+    # compile the response configuration once, when the
+    # view function is created, rather than on every request
+    #
+    # NOTE: if the configuration can't be compiled, it's left
+    # for get_response_plan to compile on each request, so the
+    # mistake is reported when the view is used (as it always
+    # was) rather than when urls.py is imported
+    #
+    @classmethod
+    def as_view(cls, **initkwargs):
+        try:
+            plan = ResponsePlan(
+                    initkwargs.get('modal', cls.modal),
+                    initkwargs.get('toast', cls.toast),
+                    initkwargs.get('updates', cls.updates),
+                )
+        except Exception:
+            plan = None
+        if plan != None:
+            initkwargs['_response_plan'] = plan
+        return super(AjaxResponseView, cls).as_view(**initkwargs)
+
+    # the compiled response configuration for this request
+    #
+    # NOTE: if modal, toast or updates were replaced after
+    # as_view() (e.g. in prepare_request), the plan no longer
+    # matches and is compiled again for just this request
+    #
+    def get_response_plan(self):
+        plan = self._response_plan
+        if plan == None or not plan.matches(self.modal, self.toast, self.updates):
+            plan = ResponsePlan(self.modal, self.toast, self.updates)
+        return plan
+
     # shared setup based on request parameters;
     #
     # If you need to validate IDs in the URL and fetch
@@ -215,22 +340,17 @@ class AjaxResponseView(AjaxView):
             # must have a Context instance to render templates
             context = RequestContext(self.request, context)
 
-        # prepare all-in-one configuration
-        response_data = {}
-        if self.modal:
-            response_data['modal'] = self.modal
-        if self.toast:
-            response_data['toast'] = self.toast
-        if self.updates:
-            response_data['updates'] = self.updates
-            
-        return AjaxMixedResponse.create(context, response_data)
+        plan = self.get_response_plan()
+        if self.stream_updates and plan.updates and not plan.modal and not plan.toast:
+            return AjaxStreamingHTMLResponse(context, plan.updates, request = self.request)
+        return AjaxMixedResponse.create(context, plan, request = self.request, concurrent = self.concurrent_updates)
 
     # handle POST request (the "normal" request)
     def post(self, request, *args, **kwargs):
 
         # do request setup
         rv = self.prepare_request(*args, **kwargs)
+        self.timer.lap('prepare_request')
         if isinstance(rv, JsonResponse):
             return rv
 
@@ -238,13 +358,16 @@ class AjaxResponseView(AjaxView):
         context = {}
         initial = {}
         rv = self.prepare_context(context)
+        self.timer.lap('prepare_context')
         if isinstance(rv, JsonResponse):
             return rv
 
         # render to AJAX response; if this returns anything
         # other than a JsonResponse, the base class code
         # will complain
-        return self.prepare_response(context)
+        response = self.prepare_response(context)
+        self.timer.lap('response')
+        return response
 
 # an AJAX form view class
 #
@@ -369,6 +492,7 @@ class AjaxFormView(AjaxResponseView):
 
         # do GET/POST combined setup
         rv = self.prepare_request(*args, **kwargs)
+        self.timer.lap('prepare_request')
         if isinstance(rv, (HttpResponse)):
             return rv
         
@@ -376,6 +500,7 @@ class AjaxFormView(AjaxResponseView):
         context = {}
         initial = {}
         rv = self.prepare_context(context, initial)
+        self.timer.lap('prepare_context')
         if isinstance(rv, (HttpResponse)):
             return rv
 
@@ -387,13 +512,17 @@ class AjaxFormView(AjaxResponseView):
         # Allows you to prepopulate the helper attributes before you prepare the form
         for k in self.helper_attrs:
             setattr(form.helper, k, self.helper_attrs[k])
+        self.timer.lap('form')
 
         rv = self.prepare_form(form)
+        self.timer.lap('prepare_form')
         if isinstance(rv, (HttpResponse)):
             return rv
         
         # render the template and give back a response
-        return render(request, self.template_name, context)
+        response = render(request, self.template_name, context)
+        self.timer.lap('render')
+        return response
         
     # basic POST handler: validate the form
     # and dispatch to a success handler
@@ -407,11 +536,21 @@ class AjaxFormView(AjaxResponseView):
         # if this is a partial validation request, record that
         # NOTE: at this point, the last field's name has
         # not been validated
+        # NOTE: the client may batch several fields into one
+        # request as a comma-separated list; until the form
+        # exists to sort them out, the last one listed stands
+        # in as the last field
         if '_partial' in request.GET:
-            self._partial_validation_last_field = request.GET['_partial']
+            self._partial_validation_fields = request.GET['_partial'].split(',')
+            self._partial_validation_last_field = self._partial_validation_fields[-1]
+
+            # don't bother if the client has already moved on
+            if self.is_superseded_request(request):
+                return AjaxSupersededResponse()
         
         # do GET/POST combined setup
         rv = self.prepare_request(*args, **kwargs)
+        self.timer.lap('prepare_request')
         if isinstance(rv, JsonResponse):
             return rv
         
@@ -421,34 +560,51 @@ class AjaxFormView(AjaxResponseView):
             form = self.form_class(request.POST, request.FILES, **self.form_attrs)
         else:
             form = self.form_class(request.POST, **self.form_attrs)
+        self.timer.lap('form')
         rv = self.prepare_form(form)
+        self.timer.lap('prepare_form')
         if isinstance(rv, JsonResponse):
             return rv
         
         if self.is_partial_validation:
+            # validate once, through the farthest of the
+            # (possibly batched) fields
+            if hasattr(form, 'find_last_field'):
+                self._partial_validation_last_field = form.find_last_field(self._partial_validation_fields)
+
+            # let the form remember unchanged field results
+            # between partial requests, if it wants to
+            if getattr(form, 'partial_validation_cache', False) and hasattr(request, 'session'):
+                form.partial_validation_cache_scope = request.session.session_key
+
             # we're only doing partial validation
             is_partially_valid = form.is_partially_valid(self._partial_validation_last_field)
+            self.timer.lap('validate')
             
             # call any processing needed for this partial form
             rv = self.process_partial_form(form)
+            self.timer.lap('process_partial_form')
             if isinstance(rv, JsonResponse):
                 return rv
             
             # whether we are valid or not, we actually go ahead 
             # and return the form error response, so that existing
             # successfully-validated fields can be highlighted
-            return AjaxFormErrorResponse(form, last_field = self._partial_validation_last_field, focus_field = request.GET.get('_focus'))
+            return AjaxFormErrorResponse(form, last_field = self._partial_validation_last_field, focus_field = request.GET.get('_focus'), compact = accepts_compact_form_errors(request))
                 
         else:        
             # validate the form and return an error response
             # NOTE: THIS MEANS ALL VALIDATION MUST BE DONE
             # IN THE FORM CLASS
-            if not form.is_valid():
-                return AjaxFormErrorResponse(form)
+            is_valid = form.is_valid()
+            self.timer.lap('validate')
+            if not is_valid:
+                return AjaxFormErrorResponse(form, compact = accepts_compact_form_errors(request))
             
         # a valid form will usually require something to
         # be done with its data
         rv = self.process_form(form)
+        self.timer.lap('process_form')
         if rv is None:
             # this means use the default target_url
             rv = self.target_url
@@ -459,13 +615,16 @@ class AjaxFormView(AjaxResponseView):
             context = {}
             initial = {}
             rv = self.prepare_context(context, initial)
+            self.timer.lap('prepare_context')
             if isinstance(rv, (HttpResponse)):
                 # in case the context-creating needs to bail
                 return rv
             rv = self.prepare_response(context)
+            self.timer.lap('response')
 
-        if isinstance(rv, JsonResponse):
-            # we now have a valid JSON response; stop
+        if isinstance(rv, (JsonResponse, AjaxStreamingHTMLResponse)):
+            # we now have a valid JSON response (possibly
+            # streamed, see prepare_response); stop
             return rv
 
         if isinstance(rv, basestring):
@@ -490,6 +649,10 @@ class AjaxFormView(AjaxResponseView):
     # you can, but you should use is_partial_validation
     # instead
     _partial_validation_last_field = None
+
+    # all the fields named in a (possibly batched) partial
+    # validation request
+    _partial_validation_fields = None
     
 
 # an AJAX form view class that handles multiple forms at once
@@ -701,6 +864,7 @@ class AjaxMultiFormView(AjaxView):
 
         # do GET/POST combined setup
         rv = self.prepare_request(*args, **kwargs)
+        self.timer.lap('prepare_request')
         if isinstance(rv, HttpResponse):
             return rv
         
@@ -729,6 +893,7 @@ class AjaxMultiFormView(AjaxView):
         # and the global context prep, after all the
         # forms are done
         rv = self.prepare_context__all(context)
+        self.timer.lap('prepare_context')
         if isinstance(rv, HttpResponse):
             return rv
 
@@ -759,13 +924,17 @@ class AjaxMultiFormView(AjaxView):
             # extra step: apply Crispy helper attributes
             for k in helper_attrs:
                 setattr(form.helper, k, helper_attrs[k])
+            self.timer.lap('form')
 
             rv = self.prepare_form(form, form_alias)
+            self.timer.lap('prepare_form')
             if isinstance(rv, HttpResponse):
                 return rv
         
         # render the template and give back a response
-        return render(request, self.template_name, context)
+        response = render(request, self.template_name, context)
+        self.timer.lap('render')
+        return response
         
     # basic POST handler: validate the form
     # and dispatch to a success handler
@@ -779,11 +948,21 @@ class AjaxMultiFormView(AjaxView):
         # if this is a partial validation request, record that
         # NOTE: at this point, the last field's name has
         # not been validated
+        # NOTE: the client may batch several fields into one
+        # request as a comma-separated list; until the form
+        # exists to sort them out, the last one listed stands
+        # in as the last field
         if '_partial' in request.GET:
-            self._partial_validation_last_field = request.GET['_partial']
+            self._partial_validation_fields = request.GET['_partial'].split(',')
+            self._partial_validation_last_field = self._partial_validation_fields[-1]
+
+            # don't bother if the client has already moved on
+            if self.is_superseded_request(request):
+                return AjaxSupersededResponse()
         
         # do GET/POST combined setup
         rv = self.prepare_request(*args, **kwargs)
+        self.timer.lap('prepare_request')
         if isinstance(rv, JsonResponse):
             return rv
         
@@ -830,34 +1009,51 @@ class AjaxMultiFormView(AjaxView):
 
         # create the form based on the submitted data
         form = form_class(request.POST, **form_attrs)
+        self.timer.lap('form')
         rv = self.prepare_form(form, form_alias)
+        self.timer.lap('prepare_form')
         if isinstance(rv, JsonResponse):
             return rv
         
         if self.is_partial_validation:
+            # validate once, through the farthest of the
+            # (possibly batched) fields
+            if hasattr(form, 'find_last_field'):
+                self._partial_validation_last_field = form.find_last_field(self._partial_validation_fields)
+
+            # let the form remember unchanged field results
+            # between partial requests, if it wants to
+            if getattr(form, 'partial_validation_cache', False) and hasattr(request, 'session'):
+                form.partial_validation_cache_scope = request.session.session_key
+
             # we're only doing partial validation
             is_partially_valid = form.is_partially_valid(self._partial_validation_last_field)
+            self.timer.lap('validate')
             
             # call any processing needed for this partial form
             rv = self.process_partial_form(form, form_alias)
+            self.timer.lap('process_partial_form')
             if isinstance(rv, JsonResponse):
                 return rv
             
             # whether we are valid or not, we actually go ahead 
             # and return the form error response, so that existing
             # successfully-validated fields can be highlighted
-            return AjaxFormErrorResponse(form, last_field = self._partial_validation_last_field, focus_field = request.GET.get('_focus'))
+            return AjaxFormErrorResponse(form, last_field = self._partial_validation_last_field, focus_field = request.GET.get('_focus'), compact = accepts_compact_form_errors(request))
                 
         else:        
             # validate the form and return an error response
             # NOTE: THIS MEANS ALL VALIDATION MUST BE DONE
             # IN THE FORM CLASS
-            if not form.is_valid():
-                return AjaxFormErrorResponse(form)
+            is_valid = form.is_valid()
+            self.timer.lap('validate')
+            if not is_valid:
+                return AjaxFormErrorResponse(form, compact = accepts_compact_form_errors(request))
             
         # a valid form will usually require something to
         # be done with its data
         rv = self.process_form(form, form_alias)
+        self.timer.lap('process_form')
         
         #**** MAKE LIKE AjaxFormView AND FALL BACK TO AjaxResponseView
         if isinstance(rv, JsonResponse):
@@ -884,4 +1080,179 @@ class AjaxMultiFormView(AjaxView):
     # you can, but you should use is_partial_validation
     # instead
     _partial_validation_last_field = None
+
+    # all the fields named in a (possibly batched) partial
+    # validation request
+    _partial_validation_fields = None
     
+
+# the client-side copy of the error message catalog, for compact
+# form errors (see AjaxFormErrorResponse); include sculpt.ajax.urls
+# to serve it
+#
+# The URL includes the catalog's language and version, so when
+# it's current the response can be cached for good; a request for
+# any other version gets the current catalog (which says what
+# version it is) but is not cached.
+#
+class ErrorCatalogView(View):
+
+    def get(self, request, language, version):
+        if not check_for_language(language):
+            raise Http404('no such language')
+        current_version, catalog_json = error_message_catalog.get_client_catalog(language)
+        response = HttpResponse(catalog_json, content_type = 'application/json')
+        if version == current_version:
+            response['Cache-Control'] = 'public, max-age=31536000'
+        else:
+            response['Cache-Control'] = 'no-cache'
+        return response
+
+# several AJAX requests in one round trip
+#
+# When the client has a batch_url (see Sculpt.ajax), calls made
+# close together are sent as one POST here, with a JSON body:
+#
+#   { "requests": [ { "url": ..., "data": ..., "headers": {...} }, ... ] }
+#
+# where data is the call's form-encoded POST data and headers are
+# its X-Sculpt-* headers. Each is resolved through the URL
+# resolver to its view, which must be an AjaxView (this needs
+# Django 1.9 or later, whose view functions know their view
+# class), and run as a POST of its own, sharing the batch request's
+# user, session and cookies. The response lists each one's result,
+# in order:
+#
+#   { "sculpt": "batch", "responses": [ { "status": 200, "body": {...} }, ... ] }
+#
+# body is the view's usual JSON response, or null if it returned
+# something else (e.g. a 405), which the client treats as a failed
+# request. An exception in one request never affects the others;
+# it becomes that request's exception response, as in AjaxView.
+#
+# A request for a view that can't be batched (see
+# AjaxView.batchable) isn't run; its result is
+#
+#   { "status": 0, "body": null, "unbatchable": true }
+#
+# and the client sends it again on its own.
+#
+# SCULPT_AJAX_BATCH is an optional dict with these keys:
+#
+#   max_requests    most requests in one batch (default 20); a
+#                   larger batch is rejected with a 400
+#
+# NOTE: the batch request itself passes through middleware (and
+# so CSRF protection), but the requests in it don't; they're
+# handed straight to their views, so per-view middleware
+# behaviour (csrf_exempt, custom middleware's process_view) does
+# not apply. Views that depend on it must set batchable = False.
+# NOTE: the batch response is compressed as a whole, following
+# SCULPT_AJAX_COMPRESSION; views that set their own compression
+# are sent on their own instead.
+# NOTE: with ATOMIC_REQUESTS, the whole batch is one transaction.
+#
+UNBATCHABLE = object()
+
+class AjaxBatchView(View):
+
+    def post(self, request):
+        options = getattr(settings, 'SCULPT_AJAX_BATCH', {})
+        try:
+            batch = json.loads(request.body)['requests']
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest('invalid batch')
+        if not isinstance(batch, list) or len(batch) > options.get('max_requests', 20):
+            return HttpResponseBadRequest('invalid batch')
+
+        # the views' responses are already JSON, so they're
+        # spliced in as they are rather than decoded and encoded
+        # again
+        items = []
+        for item in batch:
+            status, body = self.run_request(request, item)
+            if status == None:
+                items.append(b'{"status":0,"body":null,"unbatchable":true}')
+            else:
+                items.append(b'{"status":%d,"body":%s}' % (status, body if body != None else b'null'))
+        response = HttpResponse(b'{"sculpt":"batch","responses":[' + b','.join(items) + b']}', content_type = 'application/json')
+        return compress_response(request, response, get_compression_options(None))
+
+    # run one request from the batch; returns its (status, JSON
+    # body or None), or (None, None) if it can't be batched
+    def run_request(self, request, item):
+        sub_request = None
+        try:
+            sub_request = self.build_request(request, item)
+            if sub_request == None:
+                return 404, None
+            if sub_request is UNBATCHABLE:
+                return None, None
+            match = sub_request.resolver_match
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception, e:
+            # as in AjaxView.dispatch
+            if settings.DEBUG:
+                backtrace_text = ''.join(traceback.format_exception(*sys.exc_info()))
+                response = AjaxExceptionResponse({ 'code': 0, 'title': e.__class__.__name__, 'message': str(e), 'backtrace': backtrace_text })
+            else:
+                report_exception(sub_request or request, sys.exc_info())
+                response = AjaxExceptionResponse({ 'code': 0, 'title': 'Exception', 'message': 'An exception occurred.' })
+
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response.status_code, None
+        if response.streaming:
+            return response.status_code, b''.join(response.streaming_content)
+        return response.status_code, response.content
+
+    # whether requests for a view can be run in a batch
+    def is_batchable(self, view_class):
+        return view_class.batchable and view_class.compression == None
+
+    # a request for one item of the batch, None if its URL isn't
+    # an AjaxView's, or UNBATCHABLE if the view can't be batched
+    def build_request(self, request, item):
+        # form actions are absolute, so those are allowed as long
+        # as they're for this site
+        url = urlparse.urlsplit(item['url'])
+        if url.netloc and url.netloc.lower() != request.get_host().lower():
+            return None
+        if url.scheme and url.scheme.lower() != request.scheme:
+            return None
+        script_prefix = get_script_prefix()
+        if not url.path.startswith(script_prefix):
+            return None
+        path_info = '/' + url.path[len(script_prefix):]
+        try:
+            match = resolve(path_info)
+        except Resolver404:
+            return None
+        view_class = getattr(match.func, 'view_class', None)
+        if view_class == None or not issubclass(view_class, AjaxView):
+            return None
+        if not self.is_batchable(view_class):
+            return UNBATCHABLE
+
+        data = smart_bytes(item.get('data', ''))
+        sub_request = copy.copy(request)
+        sub_request.path = url.path
+        sub_request.path_info = path_info
+        sub_request.resolver_match = match
+
+        # only the item's own sculpt headers apply; the response
+        # goes back inside the batch's, so it isn't compressed
+        meta = dict([ (k, v) for k, v in request.META.iteritems() if not k.startswith('HTTP_X_SCULPT_') and k != 'HTTP_ACCEPT_ENCODING' ])
+        for name, value in item.get('headers', {}).iteritems():
+            if name.lower().startswith('x-sculpt-'):
+                meta['HTTP_' + name.upper().replace('-', '_')] = smart_bytes(value)
+        meta['PATH_INFO'] = path_info
+        meta['QUERY_STRING'] = smart_bytes(url.query)
+        meta['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        meta['CONTENT_LENGTH'] = str(len(data))
+        sub_request.META = meta
+
+        sub_request.GET = QueryDict(url.query)
+        sub_request._body = data
+        sub_request._post = QueryDict(data)
+        sub_request._files = MultiValueDict()
+        return sub_request
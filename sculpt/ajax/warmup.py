@@ -0,0 +1,178 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import get_resolver
+
+from sculpt.ajax.forms import AjaxForm
+from sculpt.ajax.responses import get_cached_template
+from sculpt.ajax.views import AjaxView, AjaxFormView, AjaxMultiFormView
+
+#
+# deployment-time warmup
+#
+# The first request each worker handles pays a number of one-time
+# costs: resolving replacement error messages for every form
+# field, importing and setting up crispy-forms, and loading and
+# compiling templates. warmup() does that work up front:
+#
+#   1. walks the URLconf and finds every AjaxView sub-class
+#      (which also imports the modules defining the forms)
+#   2. compiles each view's template_name and the templates
+#      named in its modal, toast and updates configuration
+#   3. prepares every AjaxForm sub-class (label checks and
+#      error message resolution; see AjaxForm.prepare_class)
+#   4. compiles the crispy-forms templates for the configured
+#      template pack
+#
+# Run from the server's entry point (set SCULPT_AJAX_WARMUP = True
+# and see sculpt.ajax.wsgi) this happens in the master process
+# under gunicorn --preload, so the results are shared copy-on-write
+# by all the workers. Problems
+# (missing labels, unknown error codes, missing templates) are
+# collected and raised together as ImproperlyConfigured, so a bad
+# deploy fails at startup instead of on some user's first request.
+# The sculpt_ajax_warmup management command runs the same checks.
+#
+# NOTE: templates are compiled into the sculpt-ajax template
+# cache (see sculpt.ajax.responses), so the responses that use
+# them start warm; the crispy-forms templates are rendered by
+# crispy-forms itself and are only kept if the cached template
+# loader is in use.
+#
+# NOTE: finding views in the URLconf requires Django 1.9 or later
+# (view functions expose view_class); on older versions only the
+# forms that have already been imported are prepared.
+#
+
+# walk the URLconf and yield (view_class, initkwargs) for every
+# class-based view we can identify
+def iter_url_views(patterns = None):
+    if patterns is None:
+        patterns = get_resolver(None).url_patterns
+
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            # an include(); recurse into it
+            for item in iter_url_views(pattern.url_patterns):
+                yield item
+        else:
+            callback = getattr(pattern, 'callback', None)
+            view_class = getattr(callback, 'view_class', None)
+            if view_class is not None:
+                yield view_class, getattr(callback, 'view_initkwargs', {})
+
+# all sub-classes of a class, at any depth
+def iter_subclasses(cls):
+    seen = set()
+    pending = [ cls ]
+    while pending:
+        for subclass in pending.pop().__subclasses__():
+            if subclass not in seen:
+                seen.add(subclass)
+                pending.append(subclass)
+                yield subclass
+
+# collect the template names a view will render, along with any
+# form classes it uses; initkwargs (from as_view()) take priority
+# over class attributes, just as they do for a real request
+def get_view_requirements(view_class, initkwargs):
+    def attr(name):
+        if name in initkwargs:
+            return initkwargs[name]
+        return getattr(view_class, name, None)
+
+    template_names = []
+    form_classes = []
+
+    if attr('template_name'):
+        template_names.append(attr('template_name'))
+
+    modal = attr('modal')
+    if modal:
+        for key in [ 'template_name', 'title_template_name' ]:
+            if modal.get(key):
+                template_names.append(modal[key])
+
+    toast = attr('toast')
+    if toast:
+        if toast.get('template_name'):
+            template_names.append(toast['template_name'])
+
+    for update in attr('updates') or []:
+        if update.get('template_name'):
+            template_names.append(update['template_name'])
+
+    if issubclass(view_class, AjaxFormView) and attr('form_class'):
+        form_classes.append(attr('form_class'))
+
+    if issubclass(view_class, AjaxMultiFormView) and attr('form_classes'):
+        for form_data in attr('form_classes').itervalues():
+            if isinstance(form_data, dict):
+                form_classes.append(form_data['form_class'])
+            else:
+                form_classes.append(form_data[0])
+
+    return template_names, form_classes
+
+# compile the crispy-forms templates every form render needs
+def get_crispy_template_names():
+    try:
+        from crispy_forms.utils import TEMPLATE_PACK
+    except ImportError:
+        # crispy-forms isn't installed; nothing to do
+        return []
+
+    return [
+            '%s/whole_uni_form.html' % TEMPLATE_PACK,
+            '%s/uni_form.html' % TEMPLATE_PACK,
+            '%s/field.html' % TEMPLATE_PACK,
+        ]
+
+# do the warmup; returns a dict of counts, raises
+# ImproperlyConfigured listing every problem found
+def warmup(include_urls = True):
+    problems = []
+    template_names = []
+    form_classes = set()
+    view_count = 0
+
+    # 1. views from the URLconf
+    if include_urls:
+        for view_class, initkwargs in iter_url_views():
+            if not issubclass(view_class, AjaxView):
+                continue
+            view_count += 1
+            view_templates, view_forms = get_view_requirements(view_class, initkwargs)
+            template_names.extend(view_templates)
+            form_classes.update(view_forms)
+
+    # 2. every AjaxForm we know about, including those that
+    # are only used from templates or other views; classes with
+    # no fields are abstract bases, never used as forms themselves
+    form_classes.update(iter_subclasses(AjaxForm))
+    form_classes = set([ form_class for form_class in form_classes if issubclass(form_class, AjaxForm) and form_class.base_fields ])
+
+    for form_class in form_classes:
+        try:
+            form_class.prepare_class()
+        except (AttributeError, KeyError), e:
+            problems.append('%s.%s: %s' % (form_class.__module__, form_class.__name__, e))
+
+    # 3. templates, each only once
+    template_names.extend(get_crispy_template_names())
+    compiled = set()
+    for template_name in template_names:
+        if template_name in compiled:
+            continue
+        compiled.add(template_name)
+        try:
+            get_cached_template(template_name)
+        except Exception, e:
+            problems.append('template %s: %s: %s' % (template_name, e.__class__.__name__, e))
+
+    if problems:
+        raise ImproperlyConfigured('sculpt-ajax warmup found problems:\n    ' + '\n    '.join(problems))
+
+    return {
+            'views': view_count,
+            'forms': len(form_classes),
+            'templates': len(compiled),
+        }
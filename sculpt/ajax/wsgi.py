@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application as get_django_wsgi_application
+
+#
+# WSGI entry point with warmup
+#
+# To warm up when the server starts (see sculpt.ajax.warmup), set
+# SCULPT_AJAX_WARMUP = True and use this in your project's
+# wsgi.py in place of Django's own:
+#
+#   from sculpt.ajax.wsgi import get_wsgi_application
+#   application = get_wsgi_application()
+#
+# Under gunicorn --preload, wsgi.py is imported in the master
+# process, so the warmup is done once and shared copy-on-write by
+# all the workers. Management commands never import wsgi.py, so
+# they don't pay for it.
+#
+
+def get_wsgi_application():
+    application = get_django_wsgi_application()
+    if getattr(settings, 'SCULPT_AJAX_WARMUP', False):
+        # imported here, since it imports views and forms, which
+        # needs Django to be set up
+        from sculpt.ajax.warmup import warmup
+        warmup()
+    return application